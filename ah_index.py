@@ -0,0 +1,117 @@
+import os
+import numpy as np
+from battery_log import cache_path, load_log, save_cache
+from profiling import profiled
+from smoothing import moving_average
+
+# the summary's rule: trapezoidal integral of the fitted current (moving average of V / R)
+RESISTANCE_EQ = 1.25  # equivalent resistance in Ohms for 4 parallel 5 Ohm resistors
+WINDOW_SIZE = 21  # moving average window for the fitted current
+
+
+class AhIndex:
+    """
+    Cumulative charge of one run at every sample, so charge questions are answered by a lookup
+    instead of re-integrating the log. Times are seconds since the first sample.
+
+        index = AhIndex.load("battery1_out.text")
+        index.between(600, 4200)       # Ah delivered between minute 10 and minute 70, O(log n)
+        index.time_at(50)              # seconds until 50 Ah had been delivered, O(log n)
+        index.remaining_at_voltage(12) # Ah still delivered after the fitted voltage first fell to 12 V
+
+    Every query also takes NumPy arrays and answers all of them at once.
+    """
+
+    def __init__(self, timestamps, charge, voltage_floor):
+        self.time = timestamps  # seconds since the first sample
+        self.charge = charge  # Ah delivered from the first sample up to each sample
+        self.voltage_floor = voltage_floor  # lowest fitted voltage up to each sample (never increases)
+
+    @classmethod
+    @profiled("integrate")
+    def build(cls, timestamps, voltages, window_size=WINDOW_SIZE, resistance=RESISTANCE_EQ):
+        timestamps = np.asarray(timestamps, dtype=float)
+        fit_voltages = moving_average(voltages, window_size, mode="same")
+        fit_currents = fit_voltages / resistance
+        steps = 0.5 * (fit_currents[:-1] + fit_currents[1:]) * np.diff(timestamps) / 3600
+        charge = np.concatenate(([0.0], np.cumsum(steps)))[:len(timestamps)]
+        time = timestamps - timestamps[0] if timestamps.size else timestamps
+        # the zero padding would pull the first and last fitted voltages down, so the floor
+        # averages only the samples that exist at the ends
+        coverage = moving_average(np.ones(len(fit_voltages)), window_size, mode="same")
+        return cls(time, charge, np.minimum.accumulate(fit_voltages / coverage))
+
+    @classmethod
+    @profiled("Ah index")
+    def load(cls, log_file, skip_leading_zeros=False):
+        """
+        Returns the index of a log, read from its sidecar cache (next to the parsed columns) or
+        built and saved there. Like the parsed cache, it is rebuilt when the log changes.
+        """
+        stat = os.stat(log_file)
+        timestamps, voltages = load_log(log_file, skip_leading_zeros=skip_leading_zeros)
+        folder, name = cache_path(log_file, f"{'lz-' if skip_leading_zeros else ''}ah{WINDOW_SIZE}", stat)
+        try:
+            rows = np.load(os.path.join(folder, name), mmap_mode="r").view(np.ndarray)
+            if rows.shape != (2, len(timestamps)):
+                raise ValueError("index does not match the log")
+        except (OSError, ValueError):
+            index = cls.build(timestamps, voltages)
+            save_cache(folder, name, np.vstack((index.charge, index.voltage_floor)))
+            return index
+        time = timestamps - timestamps[0] if timestamps.size else timestamps
+        return cls(time, rows[0], rows[1])
+
+    def total(self):
+        """
+        Ah delivered over the whole run (the summary's Total Ah).
+        """
+        return float(self.charge[-1]) if self.charge.size else 0.0
+
+    def remaining(self):
+        """
+        Ah still to be delivered after each sample, counting back from the end of the run.
+        """
+        return self.total() - self.charge
+
+    def charge_at(self, t):
+        """
+        Ah delivered from the start until t seconds, interpolated between samples.
+        """
+        return np.interp(t, self.time, self.charge)
+
+    def between(self, t0, t1):
+        """
+        Ah delivered between t0 and t1 seconds.
+        """
+        return self.charge_at(t1) - self.charge_at(t0)
+
+    def time_at(self, Ah):
+        """
+        Seconds from the start until Ah had been delivered, or NaN if the run never delivered that much.
+        """
+        Ah = np.asarray(Ah, dtype=float)
+        if not self.charge.size:
+            return np.full(Ah.shape, np.nan)
+        # first sample at or past Ah, then linear interpolation back to the sample before it
+        if len(self.charge) == 1:
+            return np.where(Ah <= self.charge[0], self.time[0], np.nan)
+        i = np.clip(np.searchsorted(self.charge, Ah), 1, len(self.charge) - 1)
+        q0, q1 = self.charge[i - 1], self.charge[i]
+        t0, t1 = self.time[i - 1], self.time[i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.where(q1 > q0, t0 + (Ah - q0) / (q1 - q0) * (t1 - t0), t0)
+        t = np.where(Ah <= self.charge[0], self.time[0], t)
+        return np.where(Ah > self.charge[-1], np.nan, t)
+
+    def remaining_at_voltage(self, voltage):
+        """
+        Ah still to be delivered from the first moment the fitted voltage fell to voltage or below,
+        or NaN if it never did.
+        """
+        voltage = np.asarray(voltage, dtype=float)
+        if not self.charge.size:
+            return np.full(voltage.shape, np.nan)
+        i = np.searchsorted(-self.voltage_floor, -voltage)  # floor never increases, so -floor is sorted
+        found = i < len(self.charge)
+        return np.where(found, self.total() - self.charge[np.minimum(i, len(self.charge) - 1)], np.nan)
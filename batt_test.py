@@ -1,25 +1,124 @@
 from machine import Pin, ADC
-from time import sleep, time
+from time import sleep_ms, ticks_add, ticks_diff, ticks_ms, time
+from array import array
 
-SAMPLE_INTERVAL = 1  # seconds
-CUTOFF_SENSOR_VALUE = 2.0 / 3.3  # ~0.606 
+SAMPLE_INTERVAL_MS = 1000  # time between ADC reads; can go down to a few ms
+REPORT_INTERVAL_MS = 1000  # time between printed "<time> <sensor_value>" lines (as usb_test.py prints them)
+CUTOFF_CODE = 39718  # 10 V: 2.0 V at the pin of the 5:1 divider / 3.3 V full scale * 65535 (~0.606)
+CUTOFF_WINDOW = 8  # the load is switched off once most of this many reads are below the cutoff
 
 '''
 (10V minimum for 12.8V battery and for 5:1 voltage divider --> (1.1k/5.5k ohm resistor chain for pico) 10/5 = 2.0V)
 sensor_value = 2.0V/3.3V (3.3V limit for pico ADC) ~ 0.606
 '''
 
-try:
-    analogue_input = ADC(Pin(28))  # ADC pin
-    load_switch = Pin(15, Pin.OUT)  # GPIO pin controlling the load (need to add MOSFET, relay, or solid-state switch)
-    load_switch.value(1)  # Enable the load initially
+# charge is counted in integers: the load current is code * FULL_SCALE_MV / 65535 / LOAD_MILLIOHM A, so one mAh
+# is UNIT code-milliseconds; the trapezoid sums use 2 * UNIT and are carried into whole mAh as they fill up,
+# which keeps every number a small int (no float or heap allocation per read)
+FULL_SCALE_MV = 16500  # battery voltage at a full-scale reading (3.3 V * 5)
+LOAD_MILLIOHM = 1250  # 4 parallel 5 Ohm resistors
+UNIT = 3600 * 65535 * LOAD_MILLIOHM // FULL_SCALE_MV  # code-ms per mAh
 
-    while True:
-        sensor_value = analogue_input.read_u16() / 65535  # Normalized [0, 1]
-        print(time(), sensor_value)
-        if sensor_value < CUTOFF_SENSOR_VALUE:
+
+class ChargeCounter:
+    """
+    Fixed-point Ah and runtime from raw read_u16() codes and the measured time between reads
+    (trapezoid rule, like battery_summary.py but on the raw reads). unit is the code-ms per mAh of the
+    divider and load resistance (UNIT for this board).
+    """
+
+    def __init__(self, unit=UNIT):
+        self.unit = unit
+        self.mAh = 0
+        self.rest = 0  # code-ms (times 2) not yet carried into mAh
+        self.elapsed_ms = 0
+        self.last_code = -1
+
+    def add(self, code, dt_ms):
+        if self.last_code >= 0:
+            self.rest += (self.last_code + code) * dt_ms
+            if self.rest >= 2 * self.unit:
+                carried = self.rest // (2 * self.unit)
+                self.mAh += carried
+                self.rest -= carried * 2 * self.unit
+            self.elapsed_ms += dt_ms
+        self.last_code = code
+
+    def Ah(self):
+        return (self.mAh + self.rest / (2 * self.unit)) / 1000
+
+
+class Cutoff:
+    """
+    Trips once more than half of the last window reads are below cutoff_code (the running median
+    crosses it), so a few noisy reads either side of the cutoff can't switch the load early or hold it on.
+    """
+
+    def __init__(self, cutoff_code=CUTOFF_CODE, window=CUTOFF_WINDOW):
+        self.cutoff_code = cutoff_code
+        self.low = array("B", [0] * window)  # 1 for each of the last window reads that was below the cutoff
+        self.below = 0
+        self.index = 0
+
+    def add(self, code):
+        """
+        Adds a read and returns True once the load should be switched off.
+        """
+        low = 1 if code < self.cutoff_code else 0
+        self.below += low - self.low[self.index]
+        self.low[self.index] = low
+        self.index = (self.index + 1) % len(self.low)
+        return 2 * self.below > len(self.low)
+
+
+def format_time(seconds):
+    return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def run(adc, load_switch, sample_interval_ms=SAMPLE_INTERVAL_MS, report_interval_ms=REPORT_INTERVAL_MS,
+        cutoff=None, max_reads=None):
+    """
+    Discharges until the cutoff trips (or max_reads have been taken), then switches the load off and
+    prints the delivered charge. Returns the ChargeCounter.
+    """
+    counter = ChargeCounter()
+    cutoff = cutoff or Cutoff()
+    load_switch.value(1)  # enable the load initially
+    last = next_read = last_report = ticks_ms()
+    reads = 0
+    code = 0
+    tripped = False
+    while max_reads is None or reads < max_reads:
+        code = adc.read_u16()
+        now = ticks_ms()
+        counter.add(code, ticks_diff(now, last))
+        last = now
+        reads += 1
+        if cutoff.add(code):
             load_switch.value(0)
+            tripped = True
             break
-        sleep(SAMPLE_INTERVAL)
-except KeyboardInterrupt:
-    print("Program interrupted. Exiting gracefully.")
+        if reads == 1 or ticks_diff(now, last_report) >= report_interval_ms:
+            print(time(), code / 65535)  # normalized [0, 1]
+            last_report = now
+
+        next_read = ticks_add(next_read, sample_interval_ms)
+        wait = ticks_diff(next_read, ticks_ms())
+        if wait > 0:
+            sleep_ms(wait)
+        else:
+            next_read = ticks_ms()  # fell behind: carry on from now
+    print(time(), code / 65535)
+    print("{} at {:.2f} V after {}: {:.3f} Ah delivered".format(
+        "Load off" if tripped else "Stopped", code * FULL_SCALE_MV / 65535 / 1000,
+        format_time(counter.elapsed_ms // 1000), counter.Ah()))
+    return counter
+
+
+if __name__ == "__main__":
+    try:
+        analogue_input = ADC(Pin(28))  # ADC pin
+        load_switch = Pin(15, Pin.OUT)  # GPIO pin controlling the load (need to add MOSFET, relay, or solid-state switch)
+        run(analogue_input, load_switch)
+    except KeyboardInterrupt:
+        print("Program interrupted. Exiting gracefully.")
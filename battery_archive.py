@@ -0,0 +1,197 @@
+import argparse
+import os
+import struct
+import numpy as np
+from battery_log import SCALE_FACTOR, read_appended
+from profiling import add_arguments, profiled, span, start
+
+# .bta archive: a file header, then chunks of up to CHUNK_SAMPLES samples, each with a header
+# (for seeking by time without decoding) and a payload of
+#   run_deltas  int32[runs]   timestamp step of each run of equal steps (almost always 1 s)
+#   run_counts  uint32[runs]  number of steps in each run
+#   codes       uint16[n]     raw read_u16() ADC codes
+# All numbers are little-endian. About 2 bytes per sample against ~21 for a text log.
+MAGIC = b"BTA\x00"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH")  # magic, version, reserved
+CHUNK_HEADER = struct.Struct("<4sIIqq")  # b"CHNK", samples, runs, first timestamp, last timestamp
+CHUNK_MAGIC = b"CHNK"
+CHUNK_SAMPLES = 1 << 16
+ADC_MAX = 65535  # usb_test.py prints read_u16() / 65535
+CODE_TOLERANCE = 0.05  # how far (in codes) a logged value may be from a whole code
+
+
+def to_codes(values):
+    """
+    Turns normalized sensor values back into the u16 ADC codes they were printed from.
+    Raises ValueError for values that can't have come from read_u16().
+    """
+    scaled = np.asarray(values, dtype=float) * ADC_MAX
+    codes = np.rint(scaled)
+    if codes.size and (codes.min() < 0 or codes.max() > ADC_MAX
+                       or np.abs(scaled - codes).max() > CODE_TOLERANCE):
+        raise ValueError("values are not read_u16() / 65535 readings")
+    return codes.astype(np.uint16)
+
+
+def _encode_chunk(timestamps, codes):
+    deltas = np.diff(timestamps)
+    if deltas.size and (deltas.min() < -2 ** 31 or deltas.max() >= 2 ** 31):
+        raise ValueError("timestamp step does not fit in 32 bits")
+    starts = np.flatnonzero(np.diff(deltas, prepend=deltas[:1] - 1))  # where the step changes
+    run_deltas = deltas[starts].astype("<i4")
+    run_counts = np.diff(np.append(starts, len(deltas))).astype("<u4")
+    header = CHUNK_HEADER.pack(CHUNK_MAGIC, len(codes), len(run_deltas), int(timestamps[0]), int(timestamps[-1]))
+    return b"".join((header, run_deltas.tobytes(), run_counts.tobytes(), codes.astype("<u2").tobytes()))
+
+
+@profiled("encode")
+def encode(timestamps, codes, chunk_samples=CHUNK_SAMPLES):
+    """
+    Returns the .bta bytes for whole-second timestamps and u16 ADC codes.
+    """
+    timestamps = np.asarray(timestamps)
+    if timestamps.size and not np.array_equal(timestamps, np.rint(timestamps)):
+        raise ValueError("timestamps must be whole seconds")
+    timestamps = timestamps.astype(np.int64)
+    codes = np.asarray(codes, dtype=np.uint16)
+    parts = [FILE_HEADER.pack(MAGIC, VERSION, 0)]
+    for start in range(0, len(codes), chunk_samples):
+        parts.append(_encode_chunk(timestamps[start:start + chunk_samples], codes[start:start + chunk_samples]))
+    return b"".join(parts)
+
+
+def _chunks(data):
+    """
+    Yields (offset of the payload, samples, runs, first timestamp, last timestamp) for each chunk.
+    """
+    magic, version, _ = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version 1 .bta archive")
+    pos = FILE_HEADER.size
+    while pos < len(data):
+        magic, samples, runs, first, last = CHUNK_HEADER.unpack_from(data, pos)
+        if magic != CHUNK_MAGIC:
+            raise ValueError(f"corrupt .bta archive: no chunk header at byte {pos}")
+        pos += CHUNK_HEADER.size
+        yield pos, samples, runs, first, last
+        pos += 8 * runs + 2 * samples
+
+
+@profiled("decode")
+def decode(data, start=None, stop=None):
+    """
+    Decodes .bta bytes into (timestamps, codes) as int64 and uint16 arrays. With start and/or stop,
+    only the chunks overlapping [start, stop) are decoded and only those samples are returned.
+    """
+    times, codes = [], []
+    for pos, samples, runs, first, last in _chunks(data):
+        if (start is not None and last < start) or (stop is not None and first >= stop):
+            continue
+        run_deltas = np.frombuffer(data, "<i4", runs, pos)
+        run_counts = np.frombuffer(data, "<u4", runs, pos + 4 * runs)
+        steps = np.repeat(run_deltas.astype(np.int64), run_counts)
+        times.append(first + np.concatenate(([0], np.cumsum(steps))))
+        codes.append(np.frombuffer(data, "<u2", samples, pos + 8 * runs))
+    timestamps = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+    codes = np.concatenate(codes).astype(np.uint16) if codes else np.empty(0, dtype=np.uint16)
+    if start is not None or stop is not None:
+        keep = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            keep &= timestamps >= start
+        if stop is not None:
+            keep &= timestamps < stop
+        timestamps, codes = timestamps[keep], codes[keep]
+    return timestamps, codes
+
+
+def read_archive(path, start=None, stop=None):
+    with open(path, "rb") as f:
+        return decode(f.read(), start, stop)
+
+
+def load_archive(path, scale=SCALE_FACTOR, skip_leading_zeros=False):
+    """
+    Same as battery_log.load_log for a .bta archive: (timestamps, voltages) up to the first zero
+    reading, optionally skipping zero readings before the first real sample.
+    """
+    timestamps, codes = read_archive(path)
+    if skip_leading_zeros:
+        nonzero = np.flatnonzero(codes)
+        first = nonzero[0] if nonzero.size else len(codes)
+        timestamps, codes = timestamps[first:], codes[first:]
+    zeros = np.flatnonzero(codes == 0)
+    if zeros.size:  # stops reading once the voltage is 0.0
+        timestamps, codes = timestamps[:zeros[0]], codes[:zeros[0]]
+    return timestamps.astype(float), codes / ADC_MAX * scale
+
+
+def text_to_archive(text_path, archive_path):
+    """
+    Converts a text log to .bta. Every well-formed line is kept, zero readings included, so the
+    stop rules give the same result on both; malformed lines are dropped as the text parser does.
+    """
+    timestamps, values, _ = read_appended(text_path, complete_lines=False)
+    data = encode(timestamps, to_codes(values))
+    with span("write"), open(archive_path, "wb") as f:
+        f.write(data)
+    return len(timestamps)
+
+
+_value_text = None
+
+
+def value_text(codes):
+    """
+    Returns the text usb_test.py prints for each u16 code (read_u16() / 65535 to float32 precision).
+    """
+    global _value_text
+    if _value_text is None:  # text of every possible code, built once
+        _value_text = np.array([f"{np.float32(code / ADC_MAX):.7g}" for code in range(ADC_MAX + 1)], dtype=object)
+        _value_text[[0, ADC_MAX]] = "0.0", "1.0"
+    return _value_text[codes].astype(str)
+
+
+def archive_to_text(archive_path, text_path):
+    """
+    Converts a .bta archive back to a text log. The codes survive exactly, but the last printed
+    digit can differ from the Pico's own output, since MicroPython rounds floats slightly differently.
+    """
+    timestamps, codes = read_archive(archive_path)
+    with span("format"):
+        lines = np.char.add(np.char.add(timestamps.astype(str), " "), value_text(codes))
+    with span("write"), open(text_path, "w", newline="") as f:
+        f.write("".join(line + "\r\n" for line in lines))
+    return len(timestamps)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Convert battery logs to and from the compact .bta archive format.")
+    parser.add_argument("direction", choices=["pack", "unpack"],
+                        help="pack: battery*_out.text -> .bta, unpack: .bta -> _out.text")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("-o", "--out", help="output folder (default: next to each input)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    for file in args.files:
+        base = os.path.splitext(file)[0]
+        if args.direction == "pack":
+            target = base + ".bta"
+        else:
+            target = base + ("" if base.endswith("_out") else "_out") + ".text"
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            target = os.path.join(args.out, os.path.basename(target))
+        convert = text_to_archive if args.direction == "pack" else archive_to_text
+        try:
+            samples = convert(file, target)
+        except (OSError, ValueError) as e:
+            print(f"{file}: {e}. Skipping...")
+            continue
+        print(f"{file} -> {target}: {samples} samples, {os.path.getsize(file)} -> {os.path.getsize(target)} bytes")
+
+
+if __name__ == "__main__":
+    main()
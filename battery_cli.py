@@ -0,0 +1,136 @@
+import argparse
+import glob
+import os
+import sys
+import profiling
+
+# NumPy and matplotlib are only imported inside the commands that need them, so
+# "battery_test summary" (often run every minute during a test) never pays for matplotlib
+LOG_PATTERN = "battery*_out.text"
+
+# commands with their own argument parser; everything after the command name is passed on
+DELEGATED = {
+    "summary": ("battery_summary", "summarize battery discharge logs (see battery_test summary -h)"),
+    "render": ("render_all", "save every plot as image files (see battery_test render -h)"),
+    "archive": ("battery_archive", "convert logs to and from the compact .bta format (see battery_test archive -h)"),
+    "monitor": ("live_monitor", "log usb_test.py output from stdin with running Ah and time to cutoff (see battery_test monitor -h)"),
+    "daemon": ("pico_daemon", "log several Picos at once from a rig config (see battery_test daemon -h)"),
+    "frames": ("usb_frames", "decode the binary stream of RFI_stream.py (see battery_test frames -h)"),
+    "sim": ("battery_sim", "generate synthetic logs or replay recorded ones (see battery_test sim -h)"),
+    "spectrum": ("spectrum", "print the power spectra of charge controller captures (see battery_test spectrum -h)"),
+}
+
+
+def plot(args):
+    import plots
+    from battery_meta import label, log_file, resolve
+
+    try:
+        run = resolve(args.batt_name)
+        if args.kind == "voltage":
+            plots.voltage_figure(log_file(run), args.batt_name)
+        elif args.kind == "Ah":
+            plots.Ah_figure(log_file(run), label(run))
+        else:
+            plots.percent_figure(log_file(run), label(run))
+    except FileNotFoundError as e:
+        sys.exit(f"Error: {e.filename} not found.")
+    except ValueError as e:  # logs with no usable data
+        sys.exit(str(e))
+    plots.show()
+
+
+def master(args):
+    import plots
+
+    log_files = sorted(glob.glob(LOG_PATTERN))
+    if args.kind == "voltage":
+        plots.master_voltage_figure(log_files, args.interactive)
+    elif args.kind == "Ah":
+        plots.master_Ah_figure(log_files, args.interactive)
+    else:
+        plots.master_percent_figure(log_files)
+    plots.show()
+
+
+def fft(args):
+    import plots
+
+    plots.fft_figure(args.pwm_file, args.mppt_file, args.interval, args.segment)
+    plots.show()
+
+
+def ingest(args):
+    """
+    Loads logs into the run store (battery_store.py). The parsed columns are cached on the way,
+    so later summaries and plots start from the cached arrays too.
+    """
+    from battery_log import load_log
+    from battery_store import RunStore
+
+    files = []
+    for file in args.files or sorted(glob.glob(LOG_PATTERN)):
+        if not os.path.exists(file):
+            print(f"{file} not found. Skipping...")
+            continue
+        files.append(file)
+
+    with RunStore(args.store) as store:
+        for file, status in store.ingest(files):
+            load_log(file, skip_leading_zeros=True)  # plot_voltage.py and plot_Ah.py read it this way
+            print(f"{file}: {status}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="battery_test", description="Battery discharge test tools.")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+    profile = argparse.ArgumentParser(add_help=False)  # the delegated commands take these options themselves
+    profiling.add_arguments(profile)
+
+    for name, (_, help_text) in DELEGATED.items():
+        commands.add_parser(name, help=help_text, add_help=False)
+
+    plot_parser = commands.add_parser("plot", help="plot one battery", parents=[profile])
+    plot_parser.add_argument("kind", choices=["voltage", "Ah", "percent"])
+    plot_parser.add_argument("batt_name", help="battery number or label (e.g. 1, 4S, 2S; percent takes numbers only)")
+    plot_parser.set_defaults(func=plot)
+
+    master_parser = commands.add_parser("master", help="plot every battery on one figure", parents=[profile])
+    master_parser.add_argument("kind", choices=["voltage", "Ah", "percent"])
+    master_parser.add_argument("--interactive", action="store_true",
+                               help="redraw lines at the detail of the current view when panning or zooming (voltage and Ah)")
+    master_parser.set_defaults(func=master)
+
+    fft_parser = commands.add_parser("fft", help="plot the spectra of the PWM and MPPT charge controller logs",
+                                     parents=[profile])
+    fft_parser.add_argument("pwm_file", nargs="?", default="charge_controller_tests/pwm_test0.text")
+    fft_parser.add_argument("mppt_file", nargs="?", default="charge_controller_tests/mppt_test0.text")
+    fft_parser.add_argument("--interval", type=float,
+                            help="sampling interval in seconds (default: estimated from the timestamps)")
+    fft_parser.add_argument("--segment", type=int, default=256,
+                            help="samples per Welch segment; the frequency resolution is the rate / segment (default: 256)")
+    fft_parser.set_defaults(func=fft)
+
+    ingest_parser = commands.add_parser("ingest", help="load logs into the run store for indexed queries",
+                                        parents=[profile])
+    ingest_parser.add_argument("files", nargs="*", help=f"logs to load (default: {LOG_PATTERN})")
+    ingest_parser.add_argument("--store", default=os.path.join(".battery_cache", "runs.sqlite"),
+                               help="SQLite file to load into (default: .battery_cache/runs.sqlite)")
+    ingest_parser.set_defaults(func=ingest)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.command in DELEGATED:
+        module = __import__(DELEGATED[args.command][0])
+        return module.main(rest, prog=f"battery_test {args.command}")
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    profiling.start(args.profile, args.profile_memory)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import glob
+import os
+import warnings
+import numpy as np
+from profiling import count, profiled, span
+
+# Voltage divider scale (multiply ADC reading by this to get real battery voltage)
+SCALE_FACTOR = 3.3 * 5
+
+# parsed logs are cached as .npy sidecars in this folder next to each log
+CACHE_DIR = ".battery_cache"
+
+# bytes read at a time by iter_rows()
+CHUNK_SIZE = 1 << 20
+
+# usb_test.py prints a dead battery as "<time> 0.0", so the stop line can be found without parsing
+_ZERO_FIELD = b" 0.0"
+
+# every byte but the two separators, deleted to check the layout of a block before the bulk parse
+_LINE_SEPARATORS = b" \n"
+_NOT_SEPARATOR = bytes(sorted(set(range(256)) - set(_LINE_SEPARATORS)))
+
+
+def _find_zero_line(data, pos=0):
+    """
+    Returns the (start, end) byte span of the first well-formed "<time> 0.0" line at or after pos,
+    or None if there is no such line.
+    """
+    while True:
+        i = data.find(_ZERO_FIELD, pos)
+        if i < 0:
+            return None
+        end = i + len(_ZERO_FIELD)
+        if end == len(data) or data[end] in b"\r\n":
+            start = data.rfind(b"\n", 0, i) + 1
+            try:
+                t, v = map(float, data[start:end].split())
+                return start, end
+            except ValueError:
+                pass  # malformed lines are skipped, so they can't stop the log either
+        pos = end
+
+
+def _parse_rows(data):
+    """
+    Parses a block of "<time> <sensor_value>" lines into two float arrays.
+    When every line is two numbers separated by one space, the whole block is read with
+    one bulk NumPy parse; otherwise it falls back to a line-by-line pass that skips
+    malformed lines.
+    """
+    if not data.strip():
+        return np.empty(0), np.empty(0)
+    # spaces and newlines must alternate (one space per line), so the bulk parse can't pair up
+    # numbers from different lines; a last line without its newline ends on a space
+    separators = data.translate(None, _NOT_SEPARATOR)
+    lines = (len(separators) + 1) // 2
+    if separators == _LINE_SEPARATORS * (len(separators) // 2) + b" " * (len(separators) % 2):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")  # a number NumPy can't read stops the parse with a warning
+                numbers = np.fromstring(data, sep=" ")
+        except (ValueError, DeprecationWarning):
+            numbers = None
+        if numbers is not None and numbers.size == 2 * lines:
+            count("lines parsed", lines)
+            rows = numbers.reshape(lines, 2)
+            return rows[:, 0], rows[:, 1]
+
+    text = data.decode("utf-8", errors="replace")
+    timestamps, values = [], []
+    for line in text.splitlines():
+        try:
+            t, v = map(float, line.split())
+            timestamps.append(t)
+            values.append(v)
+        except ValueError:
+            count("lines skipped")
+            continue  # skips malformed lines
+    count("lines parsed", len(timestamps))
+    return np.array(timestamps, dtype=float), np.array(values, dtype=float)
+
+
+def read_appended(path, offset=0, complete_lines=True):
+    """
+    Parses the lines of a log that start at byte offset and returns (timestamps, sensor_values, new_offset).
+    Values are unscaled and not cut at 0.0. With complete_lines, a partially written last line
+    is left unread so the next call picks it up whole.
+    """
+    with span("read"), open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    count("bytes read", len(data))
+    end = data.rfind(b"\n") + 1 if complete_lines else len(data)
+    with span("parse"):
+        timestamps, values = _parse_rows(data[:end])
+    return timestamps, values, offset + end
+
+
+def iter_rows(path, offset=0, chunk_size=CHUNK_SIZE, complete_lines=False):
+    """
+    Parses a log in chunks of about chunk_size bytes starting at byte offset and yields
+    (timestamps, sensor_values, end_offset) per chunk, so memory use does not depend on the log's length.
+    Values are unscaled and not cut at 0.0. With complete_lines, a partially written last line is not parsed.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        rest = b""
+        while True:
+            with span("read"):
+                data = f.read(chunk_size)
+            if not data:
+                break
+            count("bytes read", len(data))
+            data = rest + data
+            end = data.rfind(b"\n") + 1  # lines are never split between chunks
+            rest = data[end:]
+            if end:
+                offset += end
+                with span("parse"):
+                    timestamps, values = _parse_rows(data[:end])
+                yield timestamps, values, offset
+        if rest and not complete_lines:
+            with span("parse"):
+                timestamps, values = _parse_rows(rest)
+            yield timestamps, values, offset + len(rest)
+
+
+def cache_path(path, kind, stat):
+    """
+    Returns (folder, name) of a sidecar .npy file derived from a log. kind tells apart the
+    different arrays kept for one log ("" for the parsed columns) and must not contain dots.
+    The log's size and mtime are part of the name, so a log that grows or is rewritten
+    never matches its old cache file.
+    """
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    kind = f".{kind}" if kind else ""
+    name = f"{os.path.basename(path)}{kind}.{stat.st_size}.{stat.st_mtime_ns}.npy"
+    return folder, name
+
+
+def save_cache(folder, name, rows):
+    """
+    Writes an array to the cache atomically and removes stale entries of the same kind for the same log.
+    Failing to write the cache (e.g. read-only folder) is not an error.
+    """
+    stem = name.rsplit(".", 3)[0]
+    try:
+        os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, rows)
+        os.replace(tmp, os.path.join(folder, name))
+        for stale in glob.glob(os.path.join(glob.escape(folder), glob.escape(stem) + ".*.*.npy")):
+            stale_name = os.path.basename(stale)
+            if stale_name != name and stale_name.rsplit(".", 3)[0] == stem:
+                os.remove(stale)
+    except OSError:
+        pass
+
+
+def _read_log(path, skip_leading_zeros):
+    """
+    Parses a log into unscaled (timestamps, sensor_values) with the stop/skip rules applied.
+    """
+    with span("read"), open(path, "rb") as f:
+        data = f.read()
+    count("bytes read", len(data))
+
+    pos = 0
+    while True:
+        # only the bytes before the stop line need parsing
+        zero_line = _find_zero_line(data, pos)
+        block = data[pos:zero_line[0]] if zero_line else data[pos:]
+        with span("parse"):
+            timestamps, values = _parse_rows(block)
+
+        if skip_leading_zeros:
+            nonzero = np.flatnonzero(values != 0.0)
+            if nonzero.size == 0 and zero_line:
+                pos = zero_line[1]  # nothing logged yet, keep looking past this zero
+                continue
+            first = nonzero[0] if nonzero.size else len(values)
+            timestamps, values = timestamps[first:], values[first:]
+
+        # zeros written some other way ("0", "0.000") are caught after parsing
+        zeros = np.flatnonzero(values == 0.0)
+        if zeros.size:
+            timestamps, values = timestamps[:zeros[0]], values[:zeros[0]]
+        return timestamps, values
+
+
+@profiled("load")
+def load_log(path, scale=SCALE_FACTOR, skip_leading_zeros=False, cache=True):
+    """
+    Reads a space-separated battery*_out.text log and returns (timestamps, voltages) as NumPy arrays.
+    Malformed lines are skipped and reading stops at the first 0.0 sensor value. With
+    skip_leading_zeros, zero readings before the first real sample are dropped instead
+    (as plot_voltage.py does). Sensor values are multiplied by scale.
+
+    With cache, the parsed columns are kept in a memory-mapped .npy file under CACHE_DIR
+    and reused until the log's size or mtime changes.
+    """
+    if not cache:
+        timestamps, values = _read_log(path, skip_leading_zeros)
+        count("samples kept", len(values))
+        return timestamps, values * scale
+
+    stat = os.stat(path)  # taken before reading, so a log written mid-parse is re-read next time
+    folder, name = cache_path(path, "lz" if skip_leading_zeros else "", stat)
+    try:
+        rows = np.load(os.path.join(folder, name), mmap_mode="r").view(np.ndarray)
+        count("cache hits")
+    except (OSError, ValueError):
+        count("cache misses")
+        rows = np.vstack(_read_log(path, skip_leading_zeros))
+        with span("write cache"):
+            save_cache(folder, name, rows)
+    count("samples kept", rows.shape[1])
+    return rows[0], rows[1] * scale
@@ -0,0 +1,44 @@
+import os
+
+# the one place run metadata is kept; battery_summary.py, the plot scripts and battery_store.py all read it
+
+# defines the advertised Ah ratings of the batteries
+advertised_Ah = {
+    "battery1": 100, "battery2": 100, "battery3": 100, "battery4": 100, "battery5": 100,
+    "battery6": 20, "battery7": 20, "battery8": 20, "battery9": 20, "battery10": 20,
+    "battery11": 20, "battery12": 100, "battery13": 100, "battery14": 100, "battery15": 100
+}
+
+# labels of runs that aren't known by their number (the rest are labelled "1", "2b", ...)
+custom_labels = {
+    "battery14": "4S",
+    "battery13": "2S",
+}
+
+
+def run_name(log_file):
+    """
+    Returns the run a log belongs to, e.g. "battery12" for battery12_out.text.
+    """
+    return os.path.basename(log_file).split("_")[0]
+
+
+def log_file(run):
+    return f"{run}_out.text"
+
+
+def label(run):
+    """
+    Returns the short label of a run used on the command line and in plot titles ("4S", "12", "2b").
+    """
+    return custom_labels.get(run, run.replace("battery", "", 1))
+
+
+def resolve(name):
+    """
+    Returns the run for a label, number or run name given on the command line ("4S", "4s", "12", "battery12").
+    """
+    for run, run_label in custom_labels.items():
+        if name.upper() == run_label.upper():
+            return run
+    return name if name.startswith("battery") else f"battery{name}"
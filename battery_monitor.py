@@ -1,54 +1,95 @@
 from machine import ADC, Pin
-from time import sleep, time
+from time import sleep_ms, ticks_add, ticks_diff, ticks_ms, time
+from batt_test import ChargeCounter, Cutoff, format_time  # copy batt_test.py to the Pico too
 
 # Voltage divider resistors
 R1 = 15000  # 15k ohms
 R2 = 3300   # 3x 1.1k ohms in series = 3.3k ohms
 
-# ADC setup
-adc = ADC(Pin(28))  # GP28 / ADC2
-VREF = 3.3
+# ADC setup (all voltage math is in integer mV on the raw read_u16() codes, like batt_test.py)
+VREF_MV = 3300
 ADC_RESOLUTION = 65535
+FULL_SCALE_MV = VREF_MV * (R1 + R2) // R2  # battery voltage at a full-scale reading
 
 # Battery parameters
-FULL_VOLTAGE = 13.4
-EMPTY_VOLTAGE = 11.6  # where we want to consider cutting off the battery
-BATTERY_CAPACITY_AH = 100
-EXPECTED_LOAD_A = 10  # estimated load in amps
-
-def read_battery_voltage():
-    raw = adc.read_u16()
-    adc_voltage = (raw / ADC_RESOLUTION) * VREF
-    battery_voltage = adc_voltage * (R1 + R2) / R2
-    return battery_voltage
-
-def battery_percentage(voltage):
-    if voltage >= FULL_VOLTAGE:
+FULL_MV = 13400
+EMPTY_MV = 11600  # where we want to consider cutting off the battery
+EMPTY_CODE = EMPTY_MV * ADC_RESOLUTION // FULL_SCALE_MV
+BATTERY_CAPACITY_MAH = 100000
+LOAD_MILLIOHM = 1250  # resistance of the load (10 A at 12.5 V); the current is measured from it, not assumed
+UNIT = 3600 * ADC_RESOLUTION * LOAD_MILLIOHM // FULL_SCALE_MV  # code-ms per mAh, for ChargeCounter
+
+SAMPLE_INTERVAL_MS = 2000  # time between CSV lines
+
+
+def battery_mv(code):
+    return code * FULL_SCALE_MV // ADC_RESOLUTION
+
+
+def load_ma(code):
+    return code * FULL_SCALE_MV * 1000 // (ADC_RESOLUTION * LOAD_MILLIOHM)
+
+
+def battery_percentage(mv):
+    if mv >= FULL_MV:
         return 100
-    elif voltage <= EMPTY_VOLTAGE:
+    elif mv <= EMPTY_MV:
         return 0
     else:
-        return int(100 * (voltage - EMPTY_VOLTAGE) / (FULL_VOLTAGE - EMPTY_VOLTAGE))
+        return 100 * (mv - EMPTY_MV) // (FULL_MV - EMPTY_MV)
+
+
+def time_remaining_centihours(percent, code):
+    """
+    Hours (times 100) until the percent left of the capacity is used up at the measured load current,
+    or None with no current.
+    """
+    current = load_ma(code)
+    if current <= 0:
+        return None
+    return BATTERY_CAPACITY_MAH * percent // current  # (capacity * percent / 100) / current * 100
 
-def time_remaining_hours(percent):
-    remaining_ah = BATTERY_CAPACITY_AH * (percent / 100)
-    if EXPECTED_LOAD_A > 0:
-        hours = remaining_ah / EXPECTED_LOAD_A
-    else:
-        hours = float('inf')
-    return hours
 
-# Print CSV header once
-print("timestamp,voltage,battery_percent,time_remaining_hours")
+def run(adc, sample_interval_ms=SAMPLE_INTERVAL_MS, max_reads=None):
+    """
+    Prints a CSV line per read until the cutoff trips (or max_reads have been taken), then the
+    delivered charge and runtime. Returns the ChargeCounter.
+    """
+    counter = ChargeCounter(UNIT)
+    cutoff = Cutoff(EMPTY_CODE)
+    # Print CSV header once
+    print("timestamp,voltage,battery_percent,time_remaining_hours")
+    last = next_read = ticks_ms()
+    reads = 0
+    code = 0
+    tripped = False
+    while max_reads is None or reads < max_reads:
+        code = adc.read_u16()
+        now = ticks_ms()
+        counter.add(code, ticks_diff(now, last))
+        last = now
+        reads += 1
+        tripped = cutoff.add(code)  # debounced: a few noisy reads below EMPTY_MV don't report 0% early
+        mv = battery_mv(code)
+        percent = 0 if tripped else max(1, battery_percentage(mv))
+        hours = time_remaining_centihours(percent, code)
 
-while True:
-    vbat = read_battery_voltage()
-    percent = battery_percentage(vbat)
-    hours_left = time_remaining_hours(percent)
-    current_time = time()
+        # Output CSV line
+        print("{:.0f},{}.{:02d},{},{}".format(time(), mv // 1000, mv % 1000 // 10, percent,
+                                          "inf" if hours is None else "{}.{:02d}".format(hours // 100, hours % 100)))
+        if tripped:
+            break
 
-    # Output CSV line
-    print(f"{current_time:.0f},{vbat:.2f},{percent},{hours_left:.2f}")
+        next_read = ticks_add(next_read, sample_interval_ms)
+        wait = ticks_diff(next_read, ticks_ms())
+        if wait > 0:
+            sleep_ms(wait)
+        else:
+            next_read = ticks_ms()  # fell behind: carry on from now
+    print("# {} at {} mV after {}: {:.3f} Ah delivered".format(
+        "Empty" if tripped else "Stopped", battery_mv(code), format_time(counter.elapsed_ms // 1000), counter.Ah()))
+    return counter
 
-    sleep(2)
 
+if __name__ == "__main__":
+    run(ADC(Pin(28)))  # GP28 / ADC2
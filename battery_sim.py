@@ -0,0 +1,249 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from battery_archive import value_text
+from battery_log import SCALE_FACTOR
+from battery_meta import log_file
+from profiling import add_arguments, profiled, start
+
+# mean voltage (V) of the 12 V runs battery1-11 at every 1% of the charge delivered before the BMS cut off,
+# from fit_curve(); "battery_sim.py fit" prints it again for a new set of logs
+CURVE = [
+    13.292, 13.222, 13.214, 13.203, 13.204, 13.195, 13.193, 13.191, 13.184, 13.181, 13.184, 13.171, 13.177,
+    13.172, 13.166, 13.156, 13.164, 13.152, 13.15, 13.142, 13.145, 13.139, 13.13, 13.129, 13.124, 13.12,
+    13.122, 13.111, 13.105, 13.107, 13.106, 13.101, 13.102, 13.095, 13.093, 13.085, 13.084, 13.076, 13.077,
+    13.072, 13.067, 13.067, 13.059, 13.059, 13.053, 13.05, 13.048, 13.047, 13.04, 13.033, 13.032, 13.034,
+    13.031, 13.022, 13.015, 13.01, 13.009, 13.001, 12.999, 12.992, 12.986, 12.976, 12.973, 12.963, 12.955,
+    12.945, 12.947, 12.933, 12.926, 12.917, 12.905, 12.902, 12.885, 12.873, 12.863, 12.85, 12.838, 12.822,
+    12.811, 12.795, 12.769, 12.76, 12.741, 12.722, 12.698, 12.68, 12.662, 12.634, 12.612, 12.585, 12.553,
+    12.507, 12.456, 12.388, 12.288, 12.174, 12.014, 11.81, 11.534, 11.128, 10.256,
+]
+NOISE = 0.063  # V, spread of the raw readings around the fitted curve in the same runs
+CUT_OFF_VOLTAGE = 5.0  # a reading below this is the BMS having disconnected the battery
+FIT_RUNS = [f"battery{i}_out.text" for i in (1, 2, 4, 5, 6, 7, 8, 9, 10, 11)]
+FIT_WINDOW = 41
+RESISTANCE_EQ = 1.25  # equivalent resistance in Ohms for 4 parallel 5 Ohm resistors
+START_TIME = 1609459200  # 2021-01-01, where the Pico's clock starts
+TAIL_SECONDS = 10  # near-zero readings after the cutoff, before the "0.0" that ends the log
+ADC_BITS = 12
+
+# battery_monitor.py's percentage and time left, for its CSV format
+MONITOR_FULL_VOLTAGE = 13.4
+MONITOR_EMPTY_VOLTAGE = 11.6
+MONITOR_CAPACITY_AH = 100
+MONITOR_INTERVAL = 2  # seconds
+
+
+def fit_curve(log_files=FIT_RUNS, points=len(CURVE)):
+    """
+    Returns (curve, noise): the mean voltage of the runs at points evenly spaced fractions of the
+    charge each delivered before its cutoff, and the median spread of the readings around their fit.
+    """
+    from battery_log import load_log
+    from smoothing import moving_average
+
+    grid = np.linspace(0, 1, points)
+    curves, noises = [], []
+    for file in log_files:
+        timestamps, voltages = load_log(file)
+        low = np.flatnonzero(voltages < CUT_OFF_VOLTAGE)
+        end = low[0] if low.size else len(voltages)
+        timestamps, voltages = timestamps[:end], voltages[:end]
+        if len(voltages) < FIT_WINDOW:
+            continue
+        # moving average, divided by the window's coverage so the ends aren't pulled down by the zero padding
+        fit = moving_average(voltages, FIT_WINDOW, mode="same") / moving_average(np.ones(len(voltages)), FIT_WINDOW, mode="same")
+        charge = np.concatenate(([0.0], np.cumsum(0.5 * (fit[1:] + fit[:-1]) * np.diff(timestamps))))
+        curves.append(np.interp(grid, charge / charge[-1], fit))
+        noises.append(np.std(voltages - fit))
+    if not curves:
+        raise ValueError("no log long enough to fit")
+    return np.mean(curves, axis=0), float(np.median(noises))
+
+
+def to_codes(voltages, scale=SCALE_FACTOR):
+    """
+    Returns the read_u16() codes a Pico would give for the voltages: a 12-bit reading scaled to 16 bits.
+    """
+    raw = np.clip(np.rint(np.asarray(voltages) / scale * (2 ** ADC_BITS - 1)), 0, 2 ** ADC_BITS - 1).astype(np.uint16)
+    return raw << (16 - ADC_BITS) | raw >> (2 * ADC_BITS - 16)
+
+
+@profiled("simulate")
+def simulate(capacity_Ah=80.0, resistance=RESISTANCE_EQ, sample_interval=1.0, noise=NOISE, dropout=0.0,
+             duration=None, start=START_TIME, tail=TAIL_SECONDS, curve=CURVE, rng=None):
+    """
+    Simulates a discharge through resistance of a battery that delivers capacity_Ah before its cutoff,
+    following curve. Returns (timestamps, voltages) of the readings: with Gaussian noise, a fraction
+    dropout of them missing, and after the cutoff tail seconds of near-zero readings ending in a 0.0,
+    like the real logs. duration cuts the run short (no cutoff, no tail).
+    """
+    rng = rng or np.random.default_rng()
+    # the time to deliver each fraction q of the charge follows from dt = capacity * R / V(q) dq
+    q = np.linspace(0, 1, 4096)
+    v = np.interp(q, np.linspace(0, 1, len(curve)), curve)
+    dt_dq = capacity_Ah * 3600 * resistance / v
+    t_q = np.concatenate(([0.0], np.cumsum(0.5 * (dt_dq[1:] + dt_dq[:-1]) * np.diff(q))))
+
+    end = t_q[-1] if duration is None else min(duration, t_q[-1])
+    times = np.arange(0, end, sample_interval)
+    voltages = np.interp(times, t_q, v) + rng.normal(0, noise, len(times))
+    if duration is None or duration > t_q[-1]:
+        tail_times = np.arange(times[-1] + sample_interval if times.size else 0.0,
+                               t_q[-1] + tail + sample_interval / 2, sample_interval)
+        tail_voltages = np.abs(rng.normal(0, noise, len(tail_times)))
+        if tail_voltages.size:
+            tail_voltages[-1] = 0.0
+        times = np.concatenate((times, tail_times))
+        voltages = np.concatenate((voltages, tail_voltages))
+    if dropout:
+        keep = rng.random(len(times)) >= dropout
+        keep[-1] = True  # the stop reading always arrives
+        times, voltages = times[keep], voltages[keep]
+    timestamps = start + times
+    if float(sample_interval).is_integer():
+        timestamps = np.rint(timestamps)  # time() on the Pico has whole seconds
+    return timestamps, voltages
+
+
+@profiled("write")
+def write_log(path, timestamps, voltages):
+    """
+    Writes readings as usb_test.py prints them ("<time> <sensor_value>\\r\\n", as saved by tee).
+    """
+    codes = to_codes(voltages)
+    times = timestamps.astype(np.int64).astype(str) if np.all(timestamps == np.rint(timestamps)) \
+        else np.char.mod("%.3f", timestamps)
+    with open(path, "w", newline="") as f:
+        f.write("".join(line + "\r\n" for line in np.char.add(np.char.add(times, " "), value_text(codes))))
+
+
+@profiled("write CSV")
+def write_monitor_csv(path, timestamps, voltages, interval=MONITOR_INTERVAL):
+    """
+    Writes readings as battery_monitor.py prints them (one every interval seconds).
+    """
+    step = max(1, int(round(interval / np.median(np.diff(timestamps))))) if len(timestamps) > 1 else 1
+    timestamps = timestamps[::step]
+    voltages = np.round(to_codes(voltages[::step]) / 65535 * SCALE_FACTOR, 2)
+    percent = np.clip((100 * (voltages - MONITOR_EMPTY_VOLTAGE) / (MONITOR_FULL_VOLTAGE - MONITOR_EMPTY_VOLTAGE)).astype(int), 0, 100)
+    hours = MONITOR_CAPACITY_AH * percent / 100 / np.maximum(voltages / RESISTANCE_EQ, 1e-3)  # at the measured load current
+    columns = (np.char.mod("%.0f", timestamps), np.char.mod("%.2f", voltages), percent.astype(str), np.char.mod("%.2f", hours))
+    lines = columns[0]
+    for column in columns[1:]:
+        lines = np.char.add(np.char.add(lines, ","), column)
+    with open(path, "w") as f:
+        f.write("timestamp,voltage,battery_percent,time_remaining_hours\n")
+        f.write("".join(line + "\n" for line in lines))
+
+
+def replay(path, speed=1.0, out=None):
+    """
+    Writes the lines of a recorded log to the file descriptor out (stdout by default) at speed times
+    the pace of their timestamps (as fast as possible for 0), like a Pico printing them live.
+    """
+    out = sys.stdout.fileno() if out is None else out
+    with open(path, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    start = time.perf_counter()
+    first = None
+    pending = []
+    for line in lines:
+        try:
+            timestamp = float(line.split()[0])
+        except (ValueError, IndexError):
+            pending.append(line)  # malformed lines go out with the next reading
+            continue
+        if first is None:
+            first = timestamp
+        if speed:
+            wait = start + (timestamp - first) / speed - time.perf_counter()
+            if wait > 0:
+                if pending:
+                    os.write(out, b"".join(pending))
+                    pending = []
+                time.sleep(wait)
+        pending.append(line)
+        if not speed and len(pending) < 1024:
+            continue
+        os.write(out, b"".join(pending))
+        pending = []
+    if pending:
+        os.write(out, b"".join(pending))
+    return len(lines)
+
+
+def open_pty():
+    """
+    Opens a pseudo-terminal that passes bytes through unchanged and returns (master fd, slave path).
+    """
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Generate synthetic discharge logs, or replay recorded ones as if a Pico were printing them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write synthetic battery*_out.text logs")
+    generate.add_argument("--runs", type=int, default=1, help="number of logs (default: 1)")
+    generate.add_argument("--first", type=int, default=101, help="battery number of the first log (default: 101)")
+    generate.add_argument("--out", default="sim", help="folder for the logs (default: sim)")
+    generate.add_argument("--capacity", type=float, default=80.0, help="Ah delivered before the cutoff (default: 80)")
+    generate.add_argument("--spread", type=float, default=0.0, help="relative spread of the capacity between runs (default: 0)")
+    generate.add_argument("--resistance", type=float, default=RESISTANCE_EQ, help=f"load in Ohms (default: {RESISTANCE_EQ})")
+    generate.add_argument("--interval", type=float, default=1.0, help="seconds between readings (default: 1)")
+    generate.add_argument("--noise", type=float, default=NOISE, help=f"reading noise in V (default: {NOISE})")
+    generate.add_argument("--dropout", type=float, default=0.0, help="fraction of readings missing (default: 0)")
+    generate.add_argument("--duration", type=float, help="stop each run after this many seconds")
+    generate.add_argument("--csv", action="store_true", help="also write battery_monitor.py CSV logs")
+    generate.add_argument("--seed", type=int, help="random seed, for repeatable logs")
+
+    fit = commands.add_parser("fit", help="print the curve and noise fitted from recorded logs")
+    fit.add_argument("files", nargs="*", default=FIT_RUNS)
+
+    play = commands.add_parser("replay", help="stream a recorded log to stdout or a pseudo-terminal")
+    play.add_argument("file")
+    play.add_argument("--speed", type=float, default=1.0, help="times real time, 0 for as fast as possible (default: 1)")
+    play.add_argument("--pty", action="store_true", help="write to a new pseudo-terminal (its path is printed) instead of stdout")
+    for command in (generate, fit, play):
+        add_arguments(command)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    if args.command == "generate":
+        rng = np.random.default_rng(args.seed)
+        os.makedirs(args.out, exist_ok=True)
+        for number in range(args.first, args.first + args.runs):
+            capacity = args.capacity * (1 + args.spread * rng.standard_normal())
+            timestamps, voltages = simulate(capacity, args.resistance, args.interval, args.noise, args.dropout,
+                                            args.duration, rng=rng)
+            path = os.path.join(args.out, log_file(f"battery{number}"))
+            write_log(path, timestamps, voltages)
+            if args.csv:
+                write_monitor_csv(os.path.join(args.out, f"battery{number}_monitor.csv"), timestamps, voltages)
+            print(f"{path}: {len(timestamps)} readings, {capacity:.1f} Ah")
+    elif args.command == "fit":
+        curve, noise = fit_curve(args.files)
+        print(f"CURVE = {np.round(curve, 3).tolist()}")
+        print(f"NOISE = {noise:.3f}")
+    else:
+        if args.pty:
+            out, path = open_pty()
+            print(f"replaying {args.file} on {path}", file=sys.stderr, flush=True)
+        else:
+            out = None
+        try:
+            lines = replay(args.file, args.speed, out)
+        except (KeyboardInterrupt, BrokenPipeError):
+            return
+        print(f"replayed {lines} lines", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
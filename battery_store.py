@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import numpy as np
+from battery_log import CACHE_DIR, load_log
+from battery_meta import advertised_Ah, label, resolve, run_name
+
+# every ingested run in one SQLite file, rebuilt from the logs whenever they change
+STORE_FILE = os.path.join(CACHE_DIR, "runs.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,      -- battery12
+    label TEXT NOT NULL,            -- 12, 4S, 2b
+    advertised_Ah REAL,
+    log_file TEXT NOT NULL,
+    size INTEGER NOT NULL,          -- size and mtime of the log when it was ingested
+    mtime_ns INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    final_voltage REAL
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    time REAL NOT NULL,             -- epoch seconds, as logged
+    voltage REAL NOT NULL           -- battery voltage (V)
+);
+CREATE INDEX IF NOT EXISTS samples_time ON samples (run_id, time);
+CREATE INDEX IF NOT EXISTS samples_voltage ON samples (run_id, voltage);
+"""
+
+RUN_COLUMNS = ["name", "label", "advertised_Ah", "log_file", "size", "mtime_ns",
+               "samples", "start_time", "end_time", "final_voltage"]
+
+
+class RunStore:
+    """
+    Samples and metadata of every discharge run, indexed on (run, time) and (run, voltage).
+    Runs can be given to the query methods by name, number or label ("battery14", "14", "4S");
+    None means every run.
+
+        with RunStore() as store:
+            store.ingest(glob.glob("battery*_out.text"))
+            first_hour = store.samples(["4S", "1"], start=0, stop=3600, relative=True)
+    """
+
+    def __init__(self, path=STORE_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, files):
+        """
+        Loads every log that is new or changed since it was last ingested and returns
+        (file, status) pairs, status being "added", "updated" or "unchanged".
+        """
+        results = []
+        for file in files:
+            name = run_name(file)
+            stat = os.stat(file)
+            row = self.conn.execute("SELECT id, size, mtime_ns FROM runs WHERE name = ?", (name,)).fetchone()
+            if row and row[1:] == (stat.st_size, stat.st_mtime_ns):
+                results.append((file, "unchanged"))
+                continue
+
+            timestamps, voltages = load_log(file)
+            with self.conn:  # one transaction per run, so a failed ingest leaves the old data
+                if row:
+                    self.conn.execute("DELETE FROM samples WHERE run_id = ?", (row[0],))
+                    self.conn.execute("DELETE FROM runs WHERE id = ?", (row[0],))
+                empty = not timestamps.size
+                cursor = self.conn.execute(
+                    f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+                    (name, label(name), advertised_Ah.get(name), file, stat.st_size, stat.st_mtime_ns,
+                     len(timestamps), None if empty else float(timestamps[0]),
+                     None if empty else float(timestamps[-1]), None if empty else float(voltages[-1])))
+                run_id = cursor.lastrowid
+                self.conn.executemany("INSERT INTO samples (run_id, time, voltage) VALUES (?, ?, ?)",
+                                      zip([run_id] * len(timestamps), timestamps.tolist(), voltages.tolist()))
+            results.append((file, "updated" if row else "added"))
+        return results
+
+    def _run_ids(self, runs):
+        """
+        Returns {name: (id, start_time)} for the given runs (every run for None), skipping unknown ones.
+        """
+        query = "SELECT name, id, start_time FROM runs"
+        if runs is None:
+            rows = self.conn.execute(query + " ORDER BY id").fetchall()
+        else:
+            names = [resolve(str(run)) for run in runs]
+            rows = self.conn.execute(f"{query} WHERE name IN ({', '.join('?' * len(names))})", names).fetchall()
+            order = {name: i for i, name in enumerate(names)}
+            rows.sort(key=lambda row: order[row[0]])
+        return {name: (run_id, start_time) for name, run_id, start_time in rows}
+
+    def runs(self, runs=None):
+        """
+        Returns the metadata of the given runs as a list of dicts with the RUN_COLUMNS keys.
+        """
+        ids = self._run_ids(runs)
+        result = []
+        for run_id, _ in ids.values():
+            row = self.conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+            result.append(dict(zip(RUN_COLUMNS, row)))
+        return result
+
+    def samples(self, runs=None, start=None, stop=None, min_voltage=None, max_voltage=None, relative=False):
+        """
+        Returns {name: (timestamps, voltages)} of the samples with start <= time < stop and
+        min_voltage <= voltage <= max_voltage (any bound can be None). With relative, start, stop and
+        the returned timestamps are seconds since the start of each run instead of epoch seconds.
+        """
+        result = {}
+        for name, (run_id, start_time) in self._run_ids(runs).items():
+            offset = start_time if relative and start_time is not None else 0.0
+            where, params = ["run_id = ?"], [run_id]
+            for column, op, bound, shift in (("time", ">=", start, offset), ("time", "<", stop, offset),
+                                             ("voltage", ">=", min_voltage, 0.0), ("voltage", "<=", max_voltage, 0.0)):
+                if bound is not None:
+                    where.append(f"{column} {op} ?")
+                    params.append(bound + shift)
+            rows = self.conn.execute(
+                f"SELECT time, voltage FROM samples WHERE {' AND '.join(where)} ORDER BY time", params).fetchall()
+            values = np.array(rows, dtype=float).reshape(-1, 2)
+            result[name] = (values[:, 0] - offset, values[:, 1])
+        return result
+
+    def first_below(self, threshold, runs=None):
+        """
+        Returns {name: seconds from the start of the run until its voltage first fell below threshold},
+        or None for runs that never did.
+        """
+        result = {}
+        for name, (run_id, start_time) in self._run_ids(runs).items():
+            (time,) = self.conn.execute("SELECT MIN(time) FROM samples WHERE run_id = ? AND voltage < ?",
+                                        (run_id, threshold)).fetchone()
+            result[name] = None if time is None else time - start_time
+        return result
@@ -1,95 +1,271 @@
 import os
 import numpy as np
 import csv
+import json
+import argparse
+from battery_meta import advertised_Ah, custom_labels, run_name
+from battery_log import CACHE_DIR, SCALE_FACTOR, iter_rows, load_log, read_appended
+from discharge_accumulator import DischargeAccumulator
+from fleet import summarize_run_list
+from profiling import add_arguments, note_workers, span, start
+from smoothing import moving_average
 
 # defines battery log files
 battery_files = [f"battery{i}_out.text" for i in range(1, 15)]
 RESISTANCE_EQ = 1.25  # equivalent resistance in Ohms for 4 parallel 5 Ohm resistors
 SAMPLE_INTERVAL = 1  # seconds (data taken once per second)
+WINDOW_SIZE = 21  # moving average window for the fitted current
 
-# defines the advertised Ah ratings of the batteries
-advertised_Ah = {
-    "battery1": 100, "battery2": 100, "battery3": 100, "battery4": 100, "battery5": 100,
-    "battery6": 20, "battery7": 20, "battery8": 20, "battery9": 20, "battery10": 20,
-    "battery11": 20, "battery12": 100, "battery13": 100, "battery14": 100, "battery15": 100
-}
-
-# Optional: Label mapping
-custom_names = {
-    "battery14": "4S",
-    "battery13": "2S",
-    "battery2b": "battery2b",
-    "battery1b": "battery1b"
-}
-
-battery_data = []
-
-for file in battery_files:
-    if not os.path.exists(file):
-        print(f"{file} not found. Skipping...")
-        continue
-
-    timestamps = []
-    voltages = []
-
-    with open(file, "r") as f:
-        for line in f:
-            try:
-                t, sensor_value = map(float, line.split())
-                if sensor_value == 0.0:
-                    break
-                # Convert normalized sensor reading to battery voltage using 5:1 divider
-                v = sensor_value * 3.3 * 5  # from sensor value to actual voltages (to avoid under-calculating values)
-                timestamps.append(t)
-                voltages.append(v)
-            except ValueError:
-                continue
-
-    if not timestamps:
-        print(f"{file} is empty or contains only zero voltage. Skipping...")
-        continue
+# per-file state for --incremental runs
+STATE_FILE = os.path.join(CACHE_DIR, "summary_state.json")
+CHECK_BYTES = 16  # bytes before the stored offset that must be unchanged for a log to count as appended to
+
+
+def summary_row(file, discharge_time, final_voltage, total_Ah):
+    battery_key = run_name(file)
+    battery_name = custom_labels.get(battery_key, battery_key)  # Replace with "4S" or "2S" if matched
+    adv_Ah = advertised_Ah.get(battery_key, "Unknown")
+
+    return [
+        battery_name, adv_Ah, discharge_time,
+        round(discharge_time / 3600, 2),
+        round(final_voltage, 3),
+        round(total_Ah, 3)
+    ]
+
+
+def summarize_log(file):
+    """
+    Reads a whole log and returns its summary row, or None if it has no usable data.
+    """
+    # Convert normalized sensor reading to battery voltage using 5:1 divider
+    timestamps, voltages = load_log(file)
+
+    if not timestamps.size:
+        return None
 
     start_time = timestamps[0]
-    timestamps = [t - start_time for t in timestamps]
+    timestamps = timestamps - start_time
 
-    window_size = 21
-    fit_voltages = np.convolve(voltages, np.ones(window_size) / window_size, mode='same')
-    fit_timestamps = timestamps[:len(fit_voltages)]
+    fit_voltages = moving_average(voltages, WINDOW_SIZE, mode='same')
 
-    discharge_time = timestamps[-1]
-    final_voltage = voltages[-1]
+    discharge_time = float(timestamps[-1])
+    final_voltage = float(voltages[-1])
 
-    currents = [v / RESISTANCE_EQ for v in voltages]
     fit_currents = fit_voltages / RESISTANCE_EQ
     fc_mid = 0.5 * (fit_currents[:-1] + fit_currents[1:])
-    total_Ah = np.sum(fc_mid * np.diff(timestamps) / 3600)
+    total_Ah = float(np.sum(fc_mid * np.diff(timestamps) / 3600))
 
-    battery_key = file.split("_")[0]
-    battery_name = custom_names.get(battery_key, battery_key)  # Replace with "4S" or "2S" if matched
-    adv_Ah = advertised_Ah.get(battery_key, "Unknown")
+    return summary_row(file, discharge_time, final_voltage, total_Ah)
 
-    battery_data.append([
-        battery_name, adv_Ah, discharge_time,
-        round(discharge_time / 3600, 2),
-        round(final_voltage, 3),
-        round(total_Ah, 3)
-    ])
-
-# print and save summary
-if battery_data:
-    header_str = f"{'Battery#':<10} {'Advertised Ah':<15} {'Discharge Time (s)':<20} {'Discharge Time (h)':<20} {'Final Voltage (V)':<20} {'Total Ah':<15}"
-    print("\nBattery Discharge Summary:\n")
-    print(header_str)
-    print("=" * 100)
-    for row in battery_data:
-        print(f"{row[0]:<10} {row[1]:<15} {row[2]:<20} {row[3]:<20} {row[4]:<20} {row[5]:<15}")
-
-    csv_filename = "battery_discharge_summary.csv"
-    with open(csv_filename, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Battery#", "Advertised Ah", "Discharge Time (s)", "Discharge Time (h)", "Final Voltage (V)", "Total Ah"])
-        writer.writerows(battery_data)
-
-    print(f"\nCSV summary saved to {csv_filename}.")
-else:
-    print("No valid battery data found.")
+
+def summarize_fleet(files):
+    """
+    Same rows as summarize_log for every file, computed in vectorized passes over blocks of
+    logs packed into ragged arrays (see fleet.py).
+    """
+    runs = [load_log(file) for file in files]
+    discharge_time, final_voltage, total_Ah = summarize_run_list(runs, WINDOW_SIZE, RESISTANCE_EQ)
+    rows = []
+    for k, (file, (timestamps, _)) in enumerate(zip(files, runs)):
+        if not len(timestamps):
+            rows.append(None)
+            continue
+        rows.append(summary_row(file, float(discharge_time[k]), float(final_voltage[k]), float(total_Ah[k])))
+    return rows
+
+
+def _add_until_zero(acc, timestamps, values):
+    """
+    Adds raw sensor values to acc up to the first 0.0 and returns True if one was found.
+    """
+    zeros = np.flatnonzero(values == 0.0)
+    if zeros.size:  # stops reading further once voltage is 0.0
+        timestamps, values = timestamps[:zeros[0]], values[:zeros[0]]
+    acc.add(timestamps, values * SCALE_FACTOR)
+    return bool(zeros.size)
+
+
+def summarize_stream(file):
+    """
+    Same as summarize_log, but reads the log in chunks so memory use stays bounded on very long logs.
+    """
+    acc = DischargeAccumulator(WINDOW_SIZE, RESISTANCE_EQ)
+    for timestamps, values, _ in iter_rows(file):
+        if _add_until_zero(acc, timestamps, values):
+            break
+
+    if not acc.count:
+        return None
+    return summary_row(file, acc.discharge_time(), acc.last_voltage, acc.total_Ah())
+
+
+def _tail_bytes(file, offset):
+    with open(file, "rb") as f:
+        f.seek(max(0, offset - CHECK_BYTES))
+        return f.read(min(offset, CHECK_BYTES)).hex()
+
+
+def update_state(file, entry):
+    """
+    Brings a file's stored state up to date by parsing only the bytes appended since the last run.
+    Logs that shrank or were rewritten start over; untouched logs are returned as they are.
+    """
+    stat = os.stat(file)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry
+
+    if (not entry or stat.st_size < entry["offset"]
+            or _tail_bytes(file, entry["offset"]) != entry["check"]):
+        entry = {"offset": 0, "done": False,
+                 "acc": DischargeAccumulator(WINDOW_SIZE, RESISTANCE_EQ).to_dict()}
+
+    if not entry["done"]:
+        acc = DischargeAccumulator.from_dict(entry["acc"])
+        for timestamps, values, offset in iter_rows(file, entry["offset"], complete_lines=True):
+            entry["offset"] = offset
+            if _add_until_zero(acc, timestamps, values):
+                entry["done"] = True
+                break
+        entry["acc"] = acc.to_dict()
+        entry["check"] = _tail_bytes(file, entry["offset"])
+
+    entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+    return entry
+
+
+def summarize_state(file, entry):
+    """
+    Returns the summary row for a file's stored state, or None if it has no usable data.
+    """
+    acc = DischargeAccumulator.from_dict(entry["acc"])
+    if not entry["done"] and entry["offset"] < entry["size"]:
+        # a last line without a newline is counted but not stored, it may still be being written
+        timestamps, values, _ = read_appended(file, entry["offset"], complete_lines=False)
+        _add_until_zero(acc, timestamps, values)
+
+    if not acc.count:
+        return None
+    return summary_row(file, acc.discharge_time(), acc.last_voltage, acc.total_Ah())
+
+
+def summarize_incremental(job):
+    """
+    Updates one (file, stored_entry) pair and returns (new_entry, row).
+    """
+    file, entry = job
+    entry = update_state(file, entry)
+    return entry, summarize_state(file, entry)
+
+
+def worker_count(text):
+    """
+    argparse type of -j/--workers: a number of worker processes, 0 for one per CPU core.
+    """
+    try:
+        workers = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+    if workers < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 (one per CPU core) or more, not {workers}")
+    return workers or os.cpu_count() or 1
+
+
+def run_jobs(func, jobs, workers=1):
+    """
+    Applies func to every job, fanning out over a process pool when workers > 1.
+    Results always come back in the order of jobs.
+    """
+    if workers == 1 or len(jobs) < 2:
+        return list(map(func, jobs))
+    from concurrent.futures import ProcessPoolExecutor  # only here, it adds to every run's start-up time
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def summarize_files(files, incremental=False, workers=1, stream=False, state_file=STATE_FILE):
+    """
+    Returns one summary row (or None for logs with no usable data) per file, in order.
+    With incremental, the state saved by the previous run is used and then updated.
+    With stream, each log is read in chunks instead of being loaded whole. Otherwise a single
+    worker summarizes all logs with summarize_fleet.
+    """
+    if not incremental:
+        if not stream and workers == 1:
+            return summarize_fleet(files)
+        return run_jobs(summarize_stream if stream else summarize_log, files, workers)
+
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    results = run_jobs(summarize_incremental, [(file, state.get(file)) for file in files], workers)
+
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    with open(state_file + ".tmp", "w") as f:
+        json.dump({file: entry for file, (entry, _) in zip(files, results)}, f)
+    os.replace(state_file + ".tmp", state_file)
+    return [row for _, row in results]
+
+
+def print_summary(battery_data):
+    # print and save summary
+    if battery_data:
+        header_str = f"{'Battery#':<10} {'Advertised Ah':<15} {'Discharge Time (s)':<20} {'Discharge Time (h)':<20} {'Final Voltage (V)':<20} {'Total Ah':<15}"
+        print("\nBattery Discharge Summary:\n")
+        print(header_str)
+        print("=" * 100)
+        for row in battery_data:
+            print(f"{row[0]:<10} {row[1]:<15} {row[2]:<20} {row[3]:<20} {row[4]:<20} {row[5]:<15}")
+
+        csv_filename = "battery_discharge_summary.csv"
+        with open(csv_filename, "w", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Battery#", "Advertised Ah", "Discharge Time (s)", "Discharge Time (h)", "Final Voltage (V)", "Total Ah"])
+            writer.writerows(battery_data)
+
+        print(f"\nCSV summary saved to {csv_filename}.")
+    else:
+        print("No valid battery data found.")
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Summarize battery discharge logs.")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"only read what was appended to each log since the last run (state in {STATE_FILE})")
+    parser.add_argument("-j", "--workers", type=worker_count, default=1,
+                        help="number of worker processes (0 = one per CPU core)")
+    parser.add_argument("--stream", action="store_true",
+                        help="read logs in chunks with bounded memory instead of loading them whole")
+    parser.add_argument("files", nargs="*", help="logs to summarize (default: battery1-15 in this folder)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+    workers = args.workers
+    note_workers(workers)
+
+    files = []
+    for file in args.files or battery_files:
+        if not os.path.exists(file):
+            print(f"{file} not found. Skipping...")
+            continue
+        files.append(file)
+
+    rows = summarize_files(files, args.incremental, workers, args.stream)
+
+    battery_data = []
+    for file, row in zip(files, rows):
+        if row is None:
+            print(f"{file} is empty or contains only zero voltage. Skipping...")
+            continue
+        battery_data.append(row)
+
+    with span("output"):
+        print_summary(battery_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from profiling import add_arguments, span, start
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "battery_cli.py")
+
+# (label, command) pairs timed from process start to exit; the summaries run on the logs in the
+# current folder (and rewrite its summary CSV), as they would from a cron loop
+COMMANDS = [
+    ("python (bare interpreter)", [sys.executable, "-c", "pass"]),
+    ("import numpy", [sys.executable, "-c", "import numpy"]),
+    ("import matplotlib.pyplot", [sys.executable, "-c", "import matplotlib.pyplot"]),
+    ("battery_test --help", [sys.executable, CLI, "--help"]),
+    ("battery_test summary", [sys.executable, CLI, "summary"]),
+    ("battery_test summary --incremental", [sys.executable, CLI, "summary", "--incremental"]),
+]
+
+
+def time_command(command, repeat):
+    """
+    Runs command repeat times (after one untimed warm-up run) and returns the wall times in seconds.
+    """
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def imports_matplotlib(command):
+    """
+    Returns True if running command imports matplotlib at any point.
+    """
+    result = subprocess.run([command[0], "-X", "importtime"] + command[1:],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return any(line.split("|")[-1].strip() == "matplotlib" for line in result.stderr.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time how long the battery_test commands take to start and finish.")
+    parser.add_argument("-n", "--repeat", type=int, default=10, help="timed runs per command (default: 10)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    start(args.profile, args.profile_memory)
+
+    print(f"{'Command':<38} {'Median (ms)':<14} {'Min (ms)':<12} {'Imports matplotlib':<18}")
+    print("=" * 84)
+    for label, command in COMMANDS:
+        with span(label):
+            times = time_command(command, args.repeat)
+            uses_matplotlib = "yes" if imports_matplotlib(command) else "no"
+        print(f"{label:<38} {statistics.median(times) * 1000:<14.0f} {min(times) * 1000:<12.0f} {uses_matplotlib:<18}")
+
+
+if __name__ == "__main__":
+    main()
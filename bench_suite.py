@@ -0,0 +1,308 @@
+import argparse
+import glob
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from profiling import add_arguments, span, start
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = ".bench"  # generated logs and results, next to the logs being benchmarked
+CAPTURES = [os.path.join(HERE, "charge_controller_tests", name) for name in ("pwm_test0.text", "mppt_test0.text")]
+SCALES = {"corpus": 1, "10x": 10, "100x": 100}
+RESISTANCE_EQ = 1.25  # equivalent resistance in Ohms for 4 parallel 5 Ohm resistors
+SEED = 2021
+REGRESSION = 0.10  # --compare flags stages this much slower than the baseline
+
+
+class Dataset:
+    """
+    A set of logs to run the stages on. The parsed arrays are loaded once, outside the timings,
+    for the stages that start from arrays.
+    """
+
+    def __init__(self, name, files, scale):
+        self.name = name
+        self.files = files
+        self.scale = scale
+        self._runs = None
+        self._captures = None
+
+    def runs(self):
+        from battery_log import load_log
+        if self._runs is None:
+            self._runs = [load_log(file, cache=False) for file in self.files]
+        return self._runs
+
+    def samples(self):
+        return sum(len(t) for t, _ in self.runs())
+
+    def captures(self):
+        """
+        The charge controller captures as (timestamps, voltages), repeated scale times end to end
+        (long captures for the spectra).
+        """
+        from battery_log import load_log
+        if self._captures is None:
+            self._captures = []
+            for path in CAPTURES:
+                timestamps, voltages = load_log(path, cache=False)
+                span = timestamps[-1] - timestamps[0] + np.median(np.diff(timestamps))
+                self._captures.append((np.concatenate([timestamps + k * span for k in range(self.scale)]),
+                                       np.tile(voltages, self.scale)))
+        return self._captures
+
+
+def generated_dataset(name, scale, corpus, folder):
+    """
+    Returns a Dataset of synthetic logs (battery_sim.py) with scale times the corpus' readings,
+    generating them unless folder already holds the same set.
+    """
+    import battery_sim
+    out = os.path.join(folder, name)
+    target = scale * corpus.samples()
+    params = {"target": target, "seed": SEED, "curve": battery_sim.CURVE}
+    marker = os.path.join(out, "params.json")
+    try:
+        with open(marker) as f:
+            if json.load(f) == params:
+                return Dataset(name, sorted(glob.glob(os.path.join(out, "battery*_out.text"))), scale)
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(out, exist_ok=True)
+    for stale in glob.glob(os.path.join(out, "battery*_out.text")):
+        os.remove(stale)
+    rng = np.random.default_rng(SEED)
+    files, readings, number = [], 0, 1001
+    print(f"generating {name} logs ({target} readings) in {out} ...", file=sys.stderr)
+    while readings < target:
+        timestamps, voltages = battery_sim.simulate(80 * (1 + 0.1 * rng.standard_normal()), rng=rng)
+        path = os.path.join(out, f"battery{number}_out.text")
+        battery_sim.write_log(path, timestamps, voltages)
+        files.append(path)
+        readings += len(timestamps)
+        number += 1
+    with open(marker, "w") as f:
+        json.dump(params, f)
+    return Dataset(name, files, scale)
+
+
+# stages: name -> (function of a Dataset, datasets it runs on or None for all)
+def parse(data):
+    from battery_log import load_log
+    for file in data.files:
+        load_log(file, cache=False)
+
+
+def parse_cached(data):
+    from battery_log import load_log
+    for file in data.files:
+        load_log(file)
+
+
+def smooth(window_size):
+    def stage(data):
+        from smoothing import moving_average
+        for _, voltages in data.runs():
+            moving_average(voltages, window_size, mode="same")
+    return stage
+
+
+def Ah_cumsum(data):
+    # the rectangle rule of testing_files/plot_Ah.py: every sample is one SAMPLE_INTERVAL of current
+    for _, voltages in data.runs():
+        np.cumsum(voltages / RESISTANCE_EQ * (1 / 3600))
+
+
+def Ah_trapezoid(data):
+    # the summary's rule (and AhIndex's): trapezoid of the fitted current over the real timestamps
+    from ah_index import AhIndex
+    for timestamps, voltages in data.runs():
+        AhIndex.build(timestamps, voltages)
+
+
+def summary(data):
+    from battery_summary import summarize_files
+    summarize_files(data.files)
+
+
+def fft(data):
+    # the computation of plot_fft_charge_controller.py: complex FFT of each centred capture
+    for _, capture in data.captures():
+        np.abs(np.fft.fft(capture - capture.mean()))
+
+
+def welch(data):
+    # spectrum.py: both captures resampled to their measured rate, Welch segments in batched rFFTs
+    from spectrum import welch
+    welch(data.captures())
+
+
+def _render(make_figure):
+    def stage(data):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        fig = make_figure(data)
+        fig.savefig(io.BytesIO(), format="png")
+        plt.close(fig)
+    return stage
+
+
+def _voltage_figure(data):
+    import plots
+    return plots.voltage_figure(data.files[0], "1")
+
+
+def _master_voltage_figure(data):
+    import plots
+    return plots.master_voltage_figure(data.files)
+
+
+def _fft_figure(data):
+    import plots
+    return plots.fft_figure(*CAPTURES)
+
+
+STAGES = {
+    "parse": (parse, None),
+    "parse (cached)": (parse_cached, None),
+    "smooth 21": (smooth(21), None),
+    "smooth 41": (smooth(41), None),
+    "Ah cumsum": (Ah_cumsum, None),
+    "Ah trapezoid": (Ah_trapezoid, None),
+    "summary": (summary, None),
+    "fft": (fft, None),
+    "welch": (welch, None),
+    "render voltage": (_render(_voltage_figure), ["corpus"]),
+    "render master voltage": (_render(_master_voltage_figure), ["corpus"]),
+    "render fft": (_render(_fft_figure), ["corpus"]),
+}
+
+
+def stage_size(name, data, samples):
+    """
+    Readings the stage goes through, for its throughput.
+    """
+    if name in ("fft", "welch", "render fft"):
+        return sum(len(c) for _, c in data.captures())
+    if name == "render voltage":
+        return len(data.runs()[0][0])
+    return samples
+
+
+def time_stage(func, data, repeat, budget):
+    """
+    Runs func(data) once untimed (warm-up, caches), then up to repeat timed runs or until budget
+    seconds have been spent. Returns (wall times in seconds, peak traced memory in bytes).
+    """
+    func(data)
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        start = time.perf_counter()
+        func(data)
+        times.append(time.perf_counter() - start)
+    # memory is measured in a separate run, since tracing slows everything down
+    tracemalloc.start()
+    try:
+        func(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "-C", HERE, "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline_path, threshold=REGRESSION):
+    """
+    Prints each stage's median against the baseline's and returns the (stage, dataset) pairs that got slower.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r["dataset"]): r for r in json.load(f)["results"]}
+    print(f"\nagainst {baseline_path}:")
+    slower = []
+    for r in results:
+        old = baseline.get((r["stage"], r["dataset"]))
+        if not old:
+            continue
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else math.inf
+        flag = "SLOWER" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+        print(f"{r['stage']:<24} {r['dataset']:<8} {old['median_s'] * 1000:>10.1f} -> {r['median_s'] * 1000:>10.1f} ms  x{ratio:<6.2f} {flag}")
+        if flag == "SLOWER":
+            slower.append((r["stage"], r["dataset"]))
+    return slower
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Time the parse, smooth, integrate, spectrum and render stages on the logs in this folder and on generated 10x/100x sets.")
+    parser.add_argument("--datasets", nargs="+", choices=list(SCALES), default=["corpus", "10x"],
+                        help="logs to run on (default: corpus 10x); 10x and 100x are generated in .bench/ the first time")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), metavar="STAGE",
+                        help=f"stages to run (default: all of {', '.join(STAGES)})")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="timed runs per stage (default: 5)")
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="stop repeating a stage after this many seconds (default: 10)")
+    parser.add_argument("--json", help="where to save the results (default: .bench/results-<date>.json)")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION,
+                        help=f"relative slowdown --compare reports as a regression (default: {REGRESSION})")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    sys.path.insert(0, HERE)
+    corpus = Dataset("corpus", sorted(glob.glob("battery*_out.text")), 1)
+    if not corpus.files:
+        parser.error("no battery*_out.text logs in this folder")
+    with span("datasets"):
+        datasets = [corpus if name == "corpus" else generated_dataset(name, SCALES[name], corpus, BENCH_DIR)
+                    for name in args.datasets]
+
+    print(f"{'Stage':<24} {'Dataset':<8} {'Median (ms)':>12} {'Min (ms)':>10} {'Msamples/s':>11} {'Peak (MB)':>10}")
+    print("=" * 80)
+    results = []
+    for data in datasets:
+        samples = data.samples()
+        for name in args.stages:
+            func, only = STAGES[name]
+            if only and data.name not in only:
+                continue
+            with span(f"{name} ({data.name})"):
+                times, peak = time_stage(func, data, max(1, args.repeat), args.budget)
+            median = statistics.median(times)
+            stage_samples = stage_size(name, data, samples)
+            results.append({"stage": name, "dataset": data.name, "samples": stage_samples, "runs": len(times),
+                            "median_s": median, "min_s": min(times), "peak_bytes": peak})
+            print(f"{name:<24} {data.name:<8} {median * 1000:>12.1f} {min(times) * 1000:>10.1f} "
+                  f"{stage_samples / median / 1e6:>11.2f} {peak / 2 ** 20:>10.1f}")
+        data._runs = data._captures = None  # frees the arrays before the next (bigger) set
+
+    path = args.json or os.path.join(BENCH_DIR, f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=1)
+    print(f"\nresults saved to {path}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
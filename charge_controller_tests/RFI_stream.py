@@ -0,0 +1,95 @@
+from machine import Pin, ADC, Timer
+from time import sleep_us, ticks_us
+from array import array
+import struct
+import sys
+
+# streams ADC readings as binary frames instead of printing them, so capture length is unlimited and
+# the rate is set by the timer, not by text formatting. Frames (little-endian, read by usb_frames.py):
+#   header   "<2sHHII"  magic b"BF", sequence number, samples, sample period (us), ticks_us of the first sample
+#   samples  uint16[samples]  raw read_u16() codes, one every period
+#   checksum "<I"       (sum of the samples + sequence + samples + period + tick) & 0xFFFFFFFF
+# The binary output can't pass through "mpremote run" (its raw REPL stops at byte 0x04), so start it with
+# "mpremote connect /dev/ttyACM0 run --no-follow RFI_stream.py" and read the port with usb_frames.py.
+MAGIC = b"BF"
+HEADER = "<2sHHII"
+HEADER_SIZE = 14
+SAMPLE_RATE = 1000  # samples per second
+FRAME_SAMPLES = 256  # samples per frame; two frames are held in RAM
+DURATION = None  # seconds to stream, None for until interrupted
+
+
+class Sampler:
+    """
+    Fills two preallocated frames of ADC codes from a hard timer interrupt, so sampling goes on
+    at a fixed rate while the main loop is busy writing the other frame to USB.
+    """
+
+    def __init__(self, adc, frame_samples=FRAME_SAMPLES):
+        self.adc = adc
+        self.frames = (array("H", [0] * frame_samples), array("H", [0] * frame_samples))
+        self.ticks = array("I", [0, 0])  # ticks_us of the first sample of each frame
+        self.sequence = array("H", [0, 0])
+        self.active = 0  # frame being filled
+        self.index = 0
+        self.next_sequence = 0
+        self.ready = -1  # frame waiting to be sent, -1 for none
+        self.overruns = 0  # frames overwritten before they were sent
+
+    def sample(self, timer):
+        # runs in the interrupt: no allocation, only small-int math and array stores
+        frame = self.frames[self.active]
+        i = self.index
+        if i == 0:
+            self.ticks[self.active] = ticks_us()
+            self.sequence[self.active] = self.next_sequence
+        frame[i] = self.adc.read_u16()
+        i += 1
+        if i == len(frame):
+            if self.ready >= 0:
+                self.overruns += 1
+            self.ready = self.active
+            self.active ^= 1
+            self.next_sequence = (self.next_sequence + 1) & 0xFFFF
+            i = 0
+        self.index = i
+
+
+def stream(adc, sample_rate=SAMPLE_RATE, frame_samples=FRAME_SAMPLES, duration=DURATION, out=None):
+    """
+    Samples at sample_rate and writes every full frame to out (the USB serial port by default).
+    Returns the number of frames written.
+    """
+    out = out or sys.stdout.buffer
+    period = 1000000 // sample_rate
+    sampler = Sampler(adc, frame_samples)
+    header = bytearray(HEADER_SIZE)
+    trailer = bytearray(4)
+    frames = 0
+    total = None if duration is None else int(duration * sample_rate) // frame_samples
+    timer = Timer(mode=Timer.PERIODIC, freq=sample_rate, callback=sampler.sample, hard=True)
+    try:
+        while total is None or frames < total:
+            ready = sampler.ready
+            if ready < 0:
+                sleep_us(period)
+                continue
+            frame, sequence, tick = sampler.frames[ready], sampler.sequence[ready], sampler.ticks[ready]
+            struct.pack_into(HEADER, header, 0, MAGIC, sequence, frame_samples, period, tick)
+            struct.pack_into("<I", trailer, 0, (sum(frame) + sequence + frame_samples + period + tick) & 0xFFFFFFFF)
+            out.write(header)
+            out.write(frame)
+            out.write(trailer)
+            if sampler.ready == ready:  # the other frame may already be waiting
+                sampler.ready = -1
+            frames += 1
+    finally:
+        timer.deinit()
+    return frames
+
+
+if __name__ == "__main__":
+    try:
+        stream(ADC(Pin(28)))
+    except KeyboardInterrupt:
+        pass
@@ -1,26 +1,19 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for battery_log.py
+from battery_log import load_log
 
 def read_data(filename, scale=3.3*5):
     """
     Reads data from a space-separated file and return timestamps and scaled voltages.
     Stops reading if a voltage value of 0.0 is encountered.
     """
-    timestamps = []
-    voltages = []
-    with open(filename, "r") as f:
-        for line in f:
-            try:
-                t, v = map(float, line.split())
-                if v == 0.0:
-                    break  # stop reading when voltage is 0.0
-                timestamps.append(t)
-                voltages.append(v * scale)
-            except ValueError:
-                continue  # skip any lines that cannot be parsed
-    if timestamps:
-        start_time = timestamps[0]
-        timestamps = [t - start_time for t in timestamps]  # shift so the first time is 0
+    timestamps, voltages = load_log(filename, scale)
+    if timestamps.size:
+        timestamps = timestamps - timestamps[0]  # shift so the first time is 0
     return timestamps, voltages
 
 # Read data from both files
@@ -0,0 +1,89 @@
+import numpy as np
+from profiling import profiled
+from smoothing import moving_average
+
+
+class DischargeAccumulator:
+    """
+    Builds the battery_summary.py numbers (discharge time, final voltage and trapezoidal Ah of the
+    moving-average current) from samples fed in chunks, keeping only the last window_size - 1 samples.
+
+    The moving average matches smoothing.moving_average(..., mode='same'): the log is treated as if it had
+    window_size // 2 zeros on both sides. Outputs whose window is complete are integrated as they
+    arrive; the last few, which still depend on the zero padding at the end, are added in total_Ah().
+    """
+
+    def __init__(self, window_size=21, resistance=1.25):
+        self.window_size = window_size
+        self.resistance = resistance
+        half = window_size // 2
+        self.count = 0
+        self.start_time = None
+        self.last_time = None
+        self.last_voltage = None
+        self.Ah = 0.0  # charge from the smoothed samples that can no longer change
+        self.fit_time = None  # time and current of the last of those samples
+        self.fit_current = None
+        self.tail_t = np.full(half, np.nan)  # leading zero padding has no timestamps
+        self.tail_v = np.zeros(half)
+
+    def _fit_currents(self, voltages):
+        return moving_average(voltages, self.window_size, mode='valid') / self.resistance
+
+    def _trapezoid(self, currents, times):
+        if self.fit_time is not None:
+            currents = np.concatenate(([self.fit_current], currents))
+            times = np.concatenate(([self.fit_time], times))
+        fc_mid = 0.5 * (currents[:-1] + currents[1:])
+        return float(np.sum(fc_mid * np.diff(times) / 3600))
+
+    @profiled("accumulate")
+    def add(self, timestamps, voltages):
+        """
+        Adds the next chunk of samples (seconds, volts).
+        """
+        if not len(timestamps):
+            return
+        if self.start_time is None:
+            self.start_time = float(timestamps[0])
+        self.count += len(timestamps)
+        self.last_time = float(timestamps[-1])
+        self.last_voltage = float(voltages[-1])
+
+        v = np.concatenate((self.tail_v, voltages))
+        t = np.concatenate((self.tail_t, timestamps))
+        if len(v) >= self.window_size:
+            currents = self._fit_currents(v)
+            half = self.window_size // 2
+            times = t[half:half + len(currents)]
+            self.Ah += self._trapezoid(currents, times)
+            self.fit_current, self.fit_time = float(currents[-1]), float(times[-1])
+        self.tail_v = v[-(self.window_size - 1):]
+        self.tail_t = t[-(self.window_size - 1):]
+
+    def total_Ah(self):
+        """
+        Returns the total Ah so far, finishing the smoothed curve with the trailing zero padding.
+        """
+        if not self.count:
+            return 0.0
+        half = self.window_size // 2
+        currents = self._fit_currents(np.concatenate((self.tail_v, np.zeros(half))))
+        return self.Ah + self._trapezoid(currents, self.tail_t[half:])
+
+    def discharge_time(self):
+        return self.last_time - self.start_time
+
+    def to_dict(self):
+        state = dict(vars(self))
+        state["tail_t"] = self.tail_t.tolist()
+        state["tail_v"] = self.tail_v.tolist()
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls(state["window_size"], state["resistance"])
+        vars(acc).update(state)
+        acc.tail_t = np.array(state["tail_t"], dtype=float)
+        acc.tail_v = np.array(state["tail_v"], dtype=float)
+        return acc
@@ -0,0 +1,69 @@
+import numpy as np
+from profiling import profiled
+
+
+def screen_points(fig):
+    """
+    Returns the width of a matplotlib figure in pixels, a good number of points to keep per line.
+    """
+    return int(fig.get_figwidth() * fig.dpi)
+
+
+@profiled("downsample")
+def minmax(x, y, n_out):
+    """
+    Keeps the lowest and highest sample of each of n_out // 2 equal-count buckets (plus both ends),
+    in their original order. Every voltage sag or spike survives, so the thinned line covers
+    the same pixels as the raw one.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out:
+        return x, y
+
+    buckets = max(1, n_out // 2)
+    starts = np.linspace(0, n, buckets + 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+
+    keep = [[0, n - 1]]
+    for reduce in (np.fmin, np.fmax):
+        extreme = reduce.reduceat(y, starts)
+        hits = np.flatnonzero(y == extreme[bucket])
+        _, first = np.unique(bucket[hits], return_index=True)  # first hit in each bucket
+        keep.append(hits[first])
+    keep = np.unique(np.concatenate(keep))
+    return x[keep], y[keep]
+
+
+@profiled("downsample")
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling to n_out points. Picks, in each bucket, the point
+    forming the largest triangle with the previously kept point and the next bucket's average,
+    which keeps the visual shape of a smooth curve with far fewer points. x must be monotonic.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    # the first and last points are always kept; everything between is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    sums_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sums_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])[1:]  # average of the bucket after each bucket
+    mean_y = np.append(sums_y / counts, y[-1])[1:]
+
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - mean_x[i]) * (by - y[a]) - (x[a] - bx) * (mean_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
@@ -0,0 +1,132 @@
+import numpy as np
+from profiling import profiled
+
+BLOCK_SAMPLES = 1 << 16  # samples per block in summarize_runs, small enough to stay in cache
+
+
+def concat_runs(runs):
+    """
+    Packs a list of (timestamps, values) pairs of any lengths into one flat ragged array.
+    Returns (timestamps, values, offsets) where run k is [offsets[k], offsets[k + 1]).
+    """
+    lengths = [len(timestamps) for timestamps, _ in runs]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if not runs:
+        return np.empty(0), np.empty(0), offsets
+    timestamps = np.concatenate([np.asarray(timestamps, dtype=float) for timestamps, _ in runs])
+    values = np.concatenate([np.asarray(values, dtype=float) for _, values in runs])
+    return timestamps, values, offsets
+
+
+@profiled("smooth")
+def segment_moving_average(values, offsets, window_size):
+    """
+    Moving average of every run at once, centred and zero padded at each run's ends: the same
+    numbers as smoothing.moving_average(run, window_size, mode='same') for each run on its own.
+    """
+    window_size = max(1, int(window_size))
+    half = window_size // 2
+    right = window_size - 1 - half
+    n = len(values)
+    if not n:
+        return np.empty(0)
+    offset = values.mean()  # keeps the running total small so long fleets don't lose precision
+    csum = np.empty(n + 1)
+    csum[0] = 0.0
+    np.cumsum(values - offset, out=csum[1:])
+
+    # window sums as if all runs were one series (one pass, no index arrays) ...
+    sums = np.empty(n)
+    if n >= window_size:
+        inner = sums[half:n - right]
+        np.subtract(csum[window_size:], csum[:n + 1 - window_size], out=inner)
+        inner += offset * window_size
+
+    # ... then the samples whose window crosses a run boundary (window_size - 1 per run) are redone
+    starts, stops = offsets[:-1], offsets[1:]
+    runs = np.arange(len(starts))
+    edge = np.concatenate(((starts[:, None] + np.arange(half)).ravel(),
+                           (stops[:, None] - right + np.arange(right)).ravel()))
+    edge_runs = np.concatenate((np.repeat(runs, half), np.repeat(runs, right)))
+    inside = (edge >= starts[edge_runs]) & (edge < stops[edge_runs])
+    edge, edge_runs = edge[inside], edge_runs[inside]
+    low = np.maximum(edge - half, starts[edge_runs])
+    high = np.minimum(edge - half + window_size, stops[edge_runs])
+    sums[edge] = csum[high] - csum[low] + offset * (high - low)
+    sums /= window_size
+    return sums
+
+
+@profiled("integrate")
+def segment_trapezoid(values, timestamps, offsets):
+    """
+    Trapezoidal integral of values over timestamps for every run, as one array per run.
+    """
+    n = len(values)
+    if not n:
+        return np.zeros(len(offsets) - 1)
+    steps = np.empty(n)  # twice each trapezoid, halved once per run at the end
+    np.add(values[:-1], values[1:], out=steps[:-1])
+    steps[:-1] *= np.diff(timestamps)
+    steps[-1] = 0.0
+    steps[offsets[1:-1] - 1] = 0.0  # the step from one run's last sample into the next run's first
+    totals = np.zeros(len(offsets) - 1)
+    nonempty = np.diff(offsets) > 0
+    totals[nonempty] = np.add.reduceat(steps, offsets[:-1][nonempty])
+    return 0.5 * totals
+
+
+def _summarize_block(timestamps, voltages, offsets, window_size, resistance):
+    fit_currents = segment_moving_average(voltages, offsets, window_size)
+    fit_currents /= resistance
+    return segment_trapezoid(fit_currents, timestamps, offsets) / 3600
+
+
+def summarize_runs(timestamps, voltages, offsets, window_size, resistance, block_samples=BLOCK_SAMPLES):
+    """
+    Per-run discharge time (s), final voltage and total Ah of the fitted current for a ragged
+    array of runs, with no Python loop over samples. Runs are processed in blocks of whole runs
+    of about block_samples samples, so each block's temporaries stay in cache and memory is
+    read about once. Empty runs get NaN.
+    """
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    first, last = offsets[:-1][nonempty], offsets[1:][nonempty] - 1
+
+    discharge_time = np.full(len(lengths), np.nan)
+    final_voltage = np.full(len(lengths), np.nan)
+    discharge_time[nonempty] = timestamps[last] - timestamps[first]
+    final_voltage[nonempty] = voltages[last]
+
+    # first run of each block: the run holding every block_samples-th sample
+    bounds = np.unique(np.searchsorted(offsets, np.arange(0, offsets[-1], block_samples), side="right") - 1)
+    bounds = np.append(bounds, len(lengths))
+    total_Ah = np.empty(len(lengths))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        lo, hi = offsets[a], offsets[b]
+        total_Ah[a:b] = _summarize_block(timestamps[lo:hi], voltages[lo:hi], offsets[a:b + 1] - lo,
+                                         window_size, resistance)
+    total_Ah[~nonempty] = np.nan
+    return discharge_time, final_voltage, total_Ah
+
+
+def summarize_run_list(runs, window_size, resistance, block_samples=BLOCK_SAMPLES):
+    """
+    summarize_runs for a list of (timestamps, values) pairs. Only one block of runs at a time is
+    packed into a ragged array (while it still fits in cache) and a run as long as a block is used
+    as it is, so the runs are never all copied into one array first.
+    """
+    lengths = np.array([len(timestamps) for timestamps, _ in runs], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    bounds = np.unique(np.searchsorted(offsets, np.arange(0, offsets[-1], block_samples), side="right") - 1)
+    bounds = np.append(bounds, len(runs))
+    discharge_time, final_voltage, total_Ah = (np.full(len(runs), np.nan) for _ in range(3))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if b - a == 1:
+            timestamps, values = (np.asarray(column, dtype=float) for column in runs[a])
+            block_offsets = np.array([0, len(timestamps)])
+        else:
+            timestamps, values, block_offsets = concat_runs(runs[a:b])
+        discharge_time[a:b], final_voltage[a:b], total_Ah[a:b] = summarize_runs(
+            timestamps, values, block_offsets, window_size, resistance, block_samples)
+    return discharge_time, final_voltage, total_Ah
@@ -0,0 +1,207 @@
+import argparse
+import json
+import math
+import sys
+from collections import deque
+from battery_log import SCALE_FACTOR
+from discharge_accumulator import DischargeAccumulator
+from profiling import add_arguments, count, span, start
+
+RESISTANCE_EQ = 1.25  # equivalent resistance in Ohms for 4 parallel 5 Ohm resistors
+WINDOW_SIZE = 21  # samples in the smoothed voltage and the fitted current (as in battery_summary.py)
+CUTOFF_VOLTAGE = 10.0  # the time-to-cutoff estimate is for this voltage
+TREND_SECONDS = 600  # time constant of the weighted voltage trend used for the estimate
+MIN_TREND_DROP = 0.001  # volts per TREND_SECONDS; a flatter trend gives no estimate
+
+
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
+class LiveStats:
+    """
+    Running statistics of a discharge test, updated in O(1) per sample:
+    elapsed time, Ah so far (the summary's rule, as if the test ended now), the moving average of
+    the last window_size voltages and the estimated time until the voltage reaches cutoff.
+
+    The estimate extrapolates an exponentially weighted least-squares line through the voltage
+    (weights halve about every 0.7 * trend_seconds), so it follows the recent slope of the curve.
+    Like the log readers, everything after the first 0.0 reading is ignored. A sample that repeats
+    the last timestamp is skipped, and one from before it (a Pico that rebooted and restarted its
+    log) starts the statistics over.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, resistance=RESISTANCE_EQ, cutoff=CUTOFF_VOLTAGE,
+                 trend_seconds=TREND_SECONDS):
+        self.window_size = window_size
+        self.resistance = resistance
+        self.cutoff = cutoff
+        self.trend_seconds = trend_seconds
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every sample added so far.
+        """
+        self.acc = DischargeAccumulator(self.window_size, self.resistance)
+        self.window = deque(maxlen=self.window_size)
+        self.window_sum = 0.0
+        self.stopped = False
+        # decayed sums of 1, x, x^2, y and x*y for the weighted trend line (x = elapsed seconds)
+        self.sums = [0.0] * 5
+
+    def add(self, timestamp, voltage):
+        """
+        Adds one sample (seconds, volts). Returns False if it was not used: the test has stopped,
+        or the sample repeats the last timestamp.
+        """
+        previous = self.acc.last_time
+        if previous is not None and timestamp < previous:
+            self.reset()  # time went back: the log restarted, its intervals can't be joined to the old ones
+            previous = None
+        if self.stopped:
+            return False
+        if voltage == 0.0:  # stops reading further once voltage is 0.0
+            self.stopped = True
+            return False
+        if timestamp == previous:
+            return False  # no time passed, nothing to integrate
+        self.acc.add([timestamp], [voltage])
+
+        if len(self.window) == self.window.maxlen:
+            self.window_sum -= self.window[0]
+        self.window.append(voltage)
+        self.window_sum += voltage
+
+        x = timestamp - self.acc.start_time
+        decay = 1.0 if previous is None else math.exp(-(timestamp - previous) / self.trend_seconds)
+        for i, term in enumerate((1.0, x, x * x, voltage, x * voltage)):
+            self.sums[i] = self.sums[i] * decay + term
+        return True
+
+    def smoothed_voltage(self):
+        return self.window_sum / len(self.window) if self.window else None
+
+    def slope(self):
+        """
+        Volts per second of the weighted trend line, or None with too little data.
+        """
+        s0, sx, sxx, sy, sxy = self.sums
+        spread = s0 * sxx - sx * sx
+        if s0 < 2 or spread <= 1e-9 * s0 * sxx:
+            return None
+        return (s0 * sxy - sx * sy) / spread
+
+    def time_to_cutoff(self):
+        """
+        Estimated seconds until the voltage reaches cutoff (0 once it has), or None if it isn't
+        measurably falling.
+        """
+        voltage = self.smoothed_voltage()
+        if voltage is None:
+            return None
+        if voltage <= self.cutoff:
+            return 0.0
+        slope = self.slope()
+        if slope is None or slope * self.trend_seconds > -MIN_TREND_DROP:
+            return None
+        return (voltage - self.cutoff) / -slope
+
+    def status(self):
+        acc = self.acc
+        if not acc.count:
+            return {"samples": 0, "stopped": self.stopped}
+        smoothed = self.smoothed_voltage()
+        eta = self.time_to_cutoff()
+        return {
+            "time": acc.last_time,
+            "elapsed_s": acc.discharge_time(),
+            "samples": acc.count,
+            "voltage": round(acc.last_voltage, 3),
+            "smoothed_voltage": round(smoothed, 3),
+            "current_A": round(smoothed / self.resistance, 3),
+            "Ah": round(acc.total_Ah(), 4),
+            "cutoff_V": self.cutoff,
+            "cutoff_eta_s": None if eta is None else round(eta),
+            "stopped": self.stopped,
+        }
+
+
+def parse_sample(line):
+    """
+    Returns (timestamp, sensor value) of a "<time> <sensor_value>" line, or None for any other line.
+    """
+    try:
+        timestamp, value = map(float, line.split())
+    except ValueError:
+        return None
+    return timestamp, value
+
+
+def status_line(status):
+    if not status["samples"]:
+        return "waiting for samples..."
+    eta = status["cutoff_eta_s"]
+    eta_text = "--" if eta is None else format_time(eta)
+    line = (f"{format_time(status['elapsed_s'])}  {status['voltage']:.3f} V  avg {status['smoothed_voltage']:.3f} V  "
+            f"{status['current_A']:.2f} A  {status['Ah']:.3f} Ah  to {status['cutoff_V']:g} V: {eta_text}")
+    return line + ("  [stopped]" if status["stopped"] else "")
+
+
+def monitor(lines, log, stats, emit, scale=SCALE_FACTOR):
+    """
+    Writes every line of the stream to log as it arrives and emits the status after each sample.
+    Lines that aren't samples (e.g. messages from the Pico) are logged and passed to emit as None.
+    """
+    for line in lines:
+        with span("write"):
+            log.write(line)
+            log.flush()  # so the summary and other readers see each sample right away
+        sample = parse_sample(line)
+        if sample is None:
+            count("lines skipped")
+            emit(None, line)
+            continue
+        count("lines parsed")
+        timestamp, value = sample
+        was_stopped = stats.stopped
+        with span("stats"):
+            changed = stats.add(timestamp, value * scale) or stats.stopped and not was_stopped
+        if changed:
+            with span("emit"):
+                emit(stats.status(), line)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Log the output of usb_test.py as it arrives and show running Ah, voltage and time to cutoff.",
+        epilog='e.g. mpremote connect /dev/ttyACM0 run usb_test.py | python live_monitor.py battery16_out.text')
+    parser.add_argument("log_file", help="log to write (overwritten, like tee)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per sample instead of a status line")
+    parser.add_argument("--cutoff", type=float, default=CUTOFF_VOLTAGE,
+                        help=f"voltage the time estimate is for (default: {CUTOFF_VOLTAGE:g})")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    stats = LiveStats(cutoff=args.cutoff)
+
+    def emit(status, line):
+        if status is None:
+            print(line.decode(errors="replace").rstrip(), file=sys.stderr)
+        elif args.json:
+            print(json.dumps(status), flush=True)
+        else:
+            print(status_line(status), flush=True)
+
+    with open(args.log_file, "wb") as log:
+        try:
+            monitor(sys.stdin.buffer, log, stats, emit)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+from battery_log import cache_path, save_cache
+from profiling import profiled
+
+FACTOR = 4  # samples per bucket grow by this much from one level to the next
+MIN_BUCKETS = 256  # no coarser level is built once a level has this few buckets
+
+
+def level_sizes(n, factor=FACTOR, min_buckets=MIN_BUCKETS):
+    """
+    Returns the number of buckets of each level of the pyramid of n samples (level 1 first).
+    """
+    sizes = []
+    buckets = n
+    while buckets > min_buckets:
+        buckets = -(-buckets // factor)
+        sizes.append(buckets)
+    return sizes
+
+
+def build_pyramid(values, factor=FACTOR, min_buckets=MIN_BUCKETS):
+    """
+    Builds a min/max pyramid of values. Level k splits the samples into buckets of factor**k and
+    keeps the indices of the lowest and highest sample of each bucket, in sample order, so every
+    level drawn as a line covers the same pixels as the raw data at its own scale.
+    Level 0 (the raw samples) is implied; the returned list starts at level 1.
+    """
+    values = np.asarray(values, dtype=float)
+    dtype = np.int32 if len(values) < 2 ** 31 else np.int64
+    lows = highs = np.arange(len(values), dtype=dtype)
+    levels = []
+    for buckets in level_sizes(len(values), factor, min_buckets):
+        # groups the previous level's buckets by factor (repeating the last index to fill the final group)
+        pad = buckets * factor - len(lows)
+        lows = np.pad(lows, (0, pad), mode="edge").reshape(buckets, factor)
+        highs = np.pad(highs, (0, pad), mode="edge").reshape(buckets, factor)
+        rows = np.arange(buckets)
+        lows = lows[rows, np.argmin(values[lows], axis=1)]
+        highs = highs[rows, np.argmax(values[highs], axis=1)]
+        levels.append(np.sort(np.stack((lows, highs), axis=1), axis=1).ravel())
+    return levels
+
+
+@profiled("LOD pyramid")
+def load_pyramid(log_file, values, series):
+    """
+    Returns the pyramid of values, a series derived from log_file (e.g. its voltages or their fit).
+    The pyramid is kept as one .npy file next to the log's parsed cache and rebuilt when the log
+    changes. series names the data so different series of the same log don't collide.
+    """
+    sizes = level_sizes(len(values))
+    folder, name = cache_path(log_file, f"lod-{series}", os.stat(log_file))
+    try:
+        flat = np.load(os.path.join(folder, name), mmap_mode="r").view(np.ndarray)
+        if len(flat) != 2 * sum(sizes):
+            raise ValueError("pyramid does not match the data")
+        return np.split(flat, np.cumsum([2 * size for size in sizes])[:-1]) if sizes else []
+    except (OSError, ValueError):
+        levels = build_pyramid(values)
+        save_cache(folder, name, np.concatenate(levels) if levels else np.empty(0, dtype=np.int32))
+        return levels
+
+
+def view_indices(levels, start, stop, pixels, factor=FACTOR):
+    """
+    Returns the indices of the samples to draw for samples [start, stop) on an axis pixels wide:
+    the finest level with at least one bucket per pixel, or every sample once the view is
+    narrow enough.
+    """
+    span = max(1, stop - start)
+    level = min(len(levels), int(np.log(max(1.0, span / max(1, pixels))) / np.log(factor)))
+    if level == 0:
+        return np.arange(start, stop)
+    indices = levels[level - 1]
+    return indices[np.searchsorted(indices, start):np.searchsorted(indices, stop)]
+
+
+class LODLine:
+    """
+    A line on a matplotlib axes that re-reads its pyramid whenever the x range is panned or zoomed,
+    so only about two points per pixel are ever drawn. x must be monotonic (either direction).
+    """
+
+    def __init__(self, ax, x, y, levels=None, **plot_kwargs):
+        self.ax = ax
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.levels = build_pyramid(self.y) if levels is None else levels
+        self.decreasing = len(self.x) > 1 and self.x[0] > self.x[-1]
+        self.key = -self.x if self.decreasing else self.x  # increasing copy of x for searchsorted
+        indices = self.indices(0, len(self.x))
+        self.line, = ax.plot(self.x[indices], self.y[indices], **plot_kwargs)
+        # matplotlib only keeps weak references to bound methods, the lambda keeps this object alive
+        ax.callbacks.connect("xlim_changed", lambda ax: self.update(ax))
+
+    def indices(self, start, stop):
+        return view_indices(self.levels, start, stop, int(self.ax.bbox.width))
+
+    def update(self, ax):
+        low, high = sorted(ax.get_xlim())
+        if self.decreasing:
+            low, high = -high, -low
+        # one sample past each edge so the line runs off the axes instead of stopping short
+        start = max(0, np.searchsorted(self.key, low) - 1)
+        stop = min(len(self.key), np.searchsorted(self.key, high, side="right") + 1)
+        # the pan/zoom tools redraw the canvas after changing the limits, so setting the data is enough
+        indices = self.indices(start, stop)
+        self.line.set_data(self.x[indices], self.y[indices])
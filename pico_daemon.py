@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import termios
+import time
+import tty
+from battery_log import SCALE_FACTOR
+from battery_meta import log_file, resolve
+from live_monitor import LiveStats, parse_sample, status_line
+from profiling import add_arguments, count, span, start
+
+# logs several discharge tests at once, one Pico per battery, e.g. with rig.json:
+#
+#   {
+#       "picos": [
+#           {"battery": "16", "device": "/dev/ttyACM0"},
+#           {"battery": "17", "device": "/dev/ttyACM1"},
+#           {"battery": "18", "device": "/dev/ttyACM2", "mode": "serial"}
+#       ]
+#   }
+#
+# modes: "mpremote" (default) runs "mpremote connect <device> run <script>" and reads its output,
+# "serial" reads the device directly (for a Pico running usb_test.py as main.py, or a pseudo-terminal),
+# "command" reads the output of any "command" list (e.g. a simulated Pico)
+CONFIG_FILE = "rig.json"
+SCRIPT = "usb_test.py"
+RECONNECT_DELAY = 1.0  # seconds before the first reconnect attempt, doubled after each failure
+MAX_RECONNECT_DELAY = 30.0
+STATUS_INTERVAL = 60.0  # seconds between status reports
+TAIL_BYTES = 256  # end of an existing log read at startup for its last timestamp
+
+
+async def open_serial(device):
+    """
+    Opens a serial device (or pseudo-terminal, FIFO, ...) for reading.
+    Returns (StreamReader, close coroutine function).
+    """
+    fd = os.open(device, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd, termios.TCSANOW)  # no echo, line editing or \r\n translation, keeping what has arrived
+    except termios.error:
+        pass  # not a terminal
+    reader = asyncio.StreamReader()
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                os.fdopen(fd, "rb", buffering=0))
+
+    async def close():
+        transport.close()
+
+    return reader, close
+
+
+async def open_command(command):
+    """
+    Starts a command and returns (StreamReader of its output, close coroutine function).
+    Its stderr goes to ours, so mpremote's connection errors are still shown.
+    """
+    process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE)
+
+    async def close():
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+    return process.stdout, close
+
+
+class Pico:
+    """
+    One acquisition stream: reads "<time> <sensor_value>" lines from a Pico and appends them to the
+    battery's log, reconnecting whenever the device drops. Keeps LiveStats of what it has read.
+    """
+
+    def __init__(self, battery, device=None, mode="mpremote", script=SCRIPT, command=None, folder="."):
+        if mode not in ("mpremote", "serial", "command"):
+            raise ValueError(f"unknown mode {mode!r}")
+        if (command is None) == (mode == "command") or (device is None and mode != "command"):
+            raise ValueError("mpremote and serial need a device, command needs a command")
+        self.run = resolve(str(battery))
+        self.device = device
+        self.mode = mode
+        self.command = command if mode == "command" else ["mpremote", "connect", device, "run", script]
+        self.log_path = os.path.join(folder, log_file(self.run))
+        self.stats = LiveStats()
+        self.connected = False
+        self.connections = 0
+        self.lines = 0
+
+    def source(self):
+        return self.device if self.mode == "serial" else " ".join(self.command)
+
+    async def open(self):
+        if self.mode == "serial":
+            return await open_serial(self.device)
+        return await open_command(self.command)
+
+    def status(self):
+        return {"battery": self.run, "source": self.source(), "connected": self.connected,
+                "connections": self.connections, "lines": self.lines, **self.stats.status()}
+
+    def last_logged_time(self):
+        """
+        Returns the timestamp of the last sample in the log, or None if there is none yet.
+        """
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(max(0, os.path.getsize(self.log_path) - TAIL_BYTES))
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+        for line in reversed(lines):
+            sample = parse_sample(line)
+            if sample is not None:
+                return sample[0]
+        return None
+
+    def rotate(self):
+        """
+        Moves the log aside (like transfer_data.py does with a restarted Pico file) and returns where it went.
+        """
+        backup = f"{self.log_path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        os.replace(self.log_path, backup)
+        return backup
+
+    async def acquire(self, report, reconnect_delay=RECONNECT_DELAY, max_delay=MAX_RECONNECT_DELAY):
+        """
+        Logs the stream until cancelled. The log is appended to, so a restart or reconnect continues it,
+        unless the Pico's timestamps went back (it rebooted): then the log is moved aside and a new one
+        started, so battery_summary.py never sees two runs in one log.
+        """
+        delay = reconnect_delay
+        last_time = self.last_logged_time()
+        log = open(self.log_path, "ab")
+        try:
+            while True:
+                try:
+                    reader, close = await self.open()
+                except OSError as e:
+                    report(f"{self.run}: can't open {self.source()} ({e}), retrying in {delay:g} s")
+                    await asyncio.sleep(delay)
+                    delay = min(2 * delay, max_delay)
+                    continue
+
+                self.connected = True
+                self.connections += 1
+                report(f"{self.run}: reading {self.source()} -> {self.log_path}")
+                try:
+                    while True:
+                        line = await reader.readline()
+                        if not line.endswith(b"\n"):
+                            break  # end of stream; a partial last line is dropped so the log stays line-aligned
+                        self.lines += 1
+                        delay = reconnect_delay
+                        sample = parse_sample(line)
+                        if sample is None:
+                            count("lines skipped")
+                        else:
+                            count("lines parsed")
+                            if last_time is not None and sample[0] < last_time:
+                                # a Pico that rebooted starts its clock again from 2021-01-01
+                                log.close()
+                                backup = self.rotate()
+                                log = open(self.log_path, "ab")
+                                report(f"{self.run}: timestamps went back from {last_time:.0f} to {sample[0]:.0f}, "
+                                       f"{self.log_path} moved to {backup}, statistics start over")
+                            last_time = sample[0]
+                        with span("write"):  # spans must not hold an await, the Picos' tasks would interleave
+                            log.write(line)
+                            log.flush()
+                        if sample is not None:
+                            with span("stats"):
+                                self.stats.add(sample[0], sample[1] * SCALE_FACTOR)
+                except (OSError, ValueError) as e:  # device unplugged, or a line too long to be a sample
+                    report(f"{self.run}: {e}")
+                finally:
+                    self.connected = False
+                    await close()
+                report(f"{self.run}: {self.source()} disconnected, reconnecting in {delay:g} s")
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, max_delay)
+        finally:
+            log.close()
+
+
+def load_config(path, folder=None):
+    with open(path) as f:
+        config = json.load(f)
+    folder = folder or config.get("folder", ".")
+    return [Pico(entry["battery"], entry.get("device"), entry.get("mode", "mpremote"),
+                 entry.get("script", config.get("script", SCRIPT)), entry.get("command"), folder)
+            for entry in config["picos"]]
+
+
+async def report_status(picos, as_json, interval=STATUS_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        for pico in picos:
+            status = pico.status()
+            if as_json:
+                print(json.dumps(status), flush=True)
+            else:
+                state = "up" if pico.connected else "down"
+                print(f"{pico.run:<10} {state:<5} {status_line(status)}", flush=True)
+
+
+async def run_daemon(picos, as_json=False, status_interval=STATUS_INTERVAL):
+    """
+    Acquires every stream concurrently until cancelled.
+    """
+    def report(message):
+        print(message, file=sys.stderr, flush=True)
+
+    tasks = [asyncio.create_task(pico.acquire(report)) for pico in picos]
+    if status_interval > 0:
+        tasks.append(asyncio.create_task(report_status(picos, as_json, status_interval)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Log several Picos at once, one battery each, reconnecting when a device drops.")
+    parser.add_argument("config", nargs="?", default=CONFIG_FILE, help=f"JSON rig config (default: {CONFIG_FILE})")
+    parser.add_argument("--folder", help="where to write the battery*_out.text logs (default: the config's folder or .)")
+    parser.add_argument("--json", action="store_true", help="print status reports as one JSON object per battery")
+    parser.add_argument("--status-interval", type=float, default=STATUS_INTERVAL,
+                        help=f"seconds between status reports, 0 for none (default: {STATUS_INTERVAL:g})")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    try:
+        picos = load_config(args.config, args.folder)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"can't read {args.config}: {e}")
+    runs = [pico.run for pico in picos]
+    if len(set(runs)) != len(runs):
+        parser.error("each battery can only be logged by one Pico")
+
+    try:
+        asyncio.run(run_daemon(picos, args.json, args.status_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
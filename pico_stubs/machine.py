@@ -0,0 +1,108 @@
+"""
+Stand-in for MicroPython's machine module, so the Pico scripts can run (and be timed) on Linux:
+
+    PYTHONPATH=pico_stubs python usb_test.py
+
+ADC readings come from ADC.source(pin, seconds since import), a slowly discharging battery with a
+little noise unless a test replaces it. Timer callbacks run on a background thread. Importing this module also adds the MicroPython-only
+functions of time (ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_ms, sleep_us) to CPython's time.
+"""
+import random
+import threading
+import time
+
+TICKS_PERIOD = 1 << 30  # MicroPython ticks wrap around at 2**30
+_start = time.perf_counter()
+
+
+def _ticks(scale):
+    return int((time.perf_counter() - _start) * scale) % TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) % TICKS_PERIOD
+    return diff - TICKS_PERIOD if diff >= TICKS_PERIOD // 2 else diff
+
+
+for _name, _function in (("ticks_ms", lambda: _ticks(1e3)), ("ticks_us", lambda: _ticks(1e6)),
+                         ("ticks_add", ticks_add), ("ticks_diff", ticks_diff),
+                         ("sleep_ms", lambda ms: time.sleep(ms / 1e3)), ("sleep_us", lambda us: time.sleep(us / 1e6))):
+    if not hasattr(time, _name):
+        setattr(time, _name, _function)
+
+
+def discharge(pin, t):
+    """
+    Sensor value (0..1) of a battery losing about 0.1 V an hour, with ADC noise.
+    """
+    return 0.8 - t * 1.7e-6 + random.gauss(0, 0.001)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=IN, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = value or 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+
+class ADC:
+    source = staticmethod(discharge)  # replace with any (pin, seconds) -> sensor value function
+    reads = 0
+
+    def __init__(self, pin):
+        self.pin = pin if isinstance(pin, Pin) else Pin(pin)
+
+    def read_u16(self):
+        ADC.reads += 1
+        value = min(max(ADC.source(self.pin.id, time.perf_counter() - _start), 0.0), 1.0)
+        raw = int(value * 4095 + 0.5)  # the RP2040 converter has 12 bits ...
+        return raw << 4 | raw >> 8  # ... scaled to 16 the way MicroPython does it
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, freq=None, period=None, callback=None, hard=False):
+        self._thread = None
+        if callback is not None:
+            self.init(mode=mode, freq=freq, period=period, callback=callback, hard=hard)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None, hard=False):
+        self.deinit()
+        interval = 1 / freq if freq else period / 1000
+        self._running = True
+
+        def run():
+            deadline = time.perf_counter()
+            while self._running:
+                deadline += interval
+                wait = deadline - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                if not self._running:
+                    break
+                callback(self)
+                if mode == Timer.ONE_SHOT:
+                    break
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def deinit(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
@@ -0,0 +1,392 @@
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.ticker import FuncFormatter
+from battery_log import SCALE_FACTOR, load_log
+from smoothing import fit_curve
+from downsample import lttb, minmax, screen_points
+from lod import LODLine, load_pyramid
+from ah_index import AhIndex
+from profiling import enabled, profiled, span
+from spectrum import SEGMENT_SAMPLES, welch
+
+
+def remaining_Ah(log_file, skip_leading_zeros=False):
+    """
+    Returns the charge left (Ah) at each sample of a log, counting back from the end of the discharge.
+    Read from the log's cumulative-charge index (ah_index.py), which integrates the same way as
+    the summary's Total Ah.
+    """
+    return AhIndex.load(log_file, skip_leading_zeros).remaining()
+
+
+@profiled("voltage figure")
+def voltage_figure(log_file, batt_name):
+    """
+    Battery voltage over time for one log (plot_voltage.py).
+    """
+    # Read and process file (SCALE_FACTOR in battery_log.py matches the voltage divider)
+    timestamps, voltages = load_log(log_file, SCALE_FACTOR, skip_leading_zeros=True)
+    timestamps = timestamps / 60
+
+    # Shift timestamps so end = 0
+    if timestamps.size:
+        end_time = timestamps[-1]
+        timestamps = timestamps - end_time
+
+    max_time = abs(timestamps[0]) if timestamps.size else 1
+
+    # Fit curve (moving average, each point placed at the centre of its window)
+    window_size = 41
+    fit_timestamps, fit_voltages = fit_curve(timestamps, voltages, window_size)
+
+    # Plot
+    plt.style.use('bmh')
+    fig = plt.figure(figsize=(12, 5))
+
+    # Downsample to the figure width (min/max keeps voltage sags, LTTB keeps the fit's shape)
+    points = screen_points(fig)
+    timestamps, voltages = minmax(timestamps, voltages, points)
+    fit_timestamps, fit_voltages = lttb(fit_timestamps, fit_voltages, points)
+
+    plt.plot(timestamps, voltages, marker='.', linestyle='-', color='royalblue', label="Voltage", lw=0.8)
+    plt.plot(fit_timestamps, fit_voltages, linestyle='-', color='firebrick', label="Voltage Fit", lw=1.2)
+    plt.xlabel("Time (min)")
+    plt.ylabel("Voltage (V)")
+    plt.title(f"Battery '{batt_name}' Voltage Over Time")
+    plt.yticks(np.arange(0, 15, 0.3))
+
+    # Format x-axis (positive time labels even though time goes from -max to 0)
+    xticks = np.linspace(-max_time, 0, num=10)
+    plt.xticks(xticks, labels=[f"{int(abs(t))}" for t in xticks])
+
+    plt.legend()
+    return fig
+
+
+@profiled("Ah figure")
+def Ah_figure(log_file, display_name):
+    """
+    Battery voltage vs. remaining charge for one log (plot_Ah.py).
+    Raises ValueError if the log has no usable data.
+    """
+    # Read data (SCALE_FACTOR in battery_log.py matches the voltage divider)
+    timestamps, voltages = load_log(log_file, SCALE_FACTOR, skip_leading_zeros=True)
+
+    if not timestamps.size:
+        raise ValueError(f"No valid data found in {log_file}.")
+
+    Ah_remaining = remaining_Ah(log_file, skip_leading_zeros=True)
+
+    # Fit curve (moving average, each point placed at the centre of its window)
+    window_size = 21
+    fit_Ah_remaining, fit_voltages = fit_curve(Ah_remaining, voltages, window_size)
+
+    # Plot
+    plt.style.use('bmh')
+    fig = plt.figure(figsize=(12, 6))
+
+    # Downsample to the figure width (min/max keeps voltage sags, LTTB keeps the fit's shape)
+    points = screen_points(fig)
+    Ah_remaining, voltages = minmax(Ah_remaining, voltages, points)
+    fit_Ah_remaining, fit_voltages = lttb(fit_Ah_remaining, fit_voltages, points)
+
+    plt.plot(Ah_remaining, voltages, marker='.', linestyle='-', color='royalblue',
+             alpha=0.5, lw=0.8, label=f"Battery {display_name}")
+    plt.plot(fit_Ah_remaining, fit_voltages, linestyle='-', color='firebrick',
+             lw=2.0, alpha=1, label=f"Battery {display_name} (Fitted)")
+
+    plt.xlabel("Remaining Charge (Ah)")
+    plt.ylabel("Voltage (V)")
+    plt.title(f"Battery {display_name} Voltage vs. Remaining Charge")
+    plt.yticks(np.arange(0, 15, 0.3))
+    plt.gca().invert_xaxis()
+    plt.legend()
+    return fig
+
+
+@profiled("percent figure")
+def percent_figure(log_file, batt_num):
+    """
+    Battery voltage vs. remaining percentage of the test for one log (plot_battery%.py).
+    Raises ValueError if the log has no usable data.
+    """
+    # reads space-separated files (stops at 0.0 and scales voltage to match battery voltage)
+    timestamps, voltages = load_log(log_file)
+
+    # skips empty files
+    if not timestamps.size:
+        raise ValueError(f"Error: No valid data in {log_file}.")
+
+    # normalizes timestamps to percentage remaining
+    start_time, end_time = timestamps[0], timestamps[-1]
+    normalized_time = np.zeros(len(timestamps))  # a one-sample log (no duration) sits at 0%
+    if end_time > start_time:
+        normalized_time = (timestamps - start_time) / (end_time - start_time) * 100  # converts to percentage
+
+    # computes a fit curve along the average trend (each point placed at the centre of its window)
+    window_size = 21  # odd number for symmetry
+    fit_timestamps, fit_voltages = fit_curve(normalized_time, voltages, window_size)
+
+    # plots data
+    plt.style.use('bmh')
+    fig = plt.figure(figsize=(12, 6))
+
+    # downsamples to the figure width after smoothing (min/max keeps voltage sags, LTTB keeps the fit's shape)
+    points = screen_points(fig)
+    normalized_time, voltages = minmax(normalized_time, voltages, points)
+    fit_timestamps, fit_voltages = lttb(fit_timestamps, fit_voltages, points)
+
+    plt.plot(normalized_time, voltages, marker='.', linestyle='-', color='royalblue', alpha=0.5, lw=0.8, label=f"Battery {batt_num}")
+    plt.plot(fit_timestamps, fit_voltages, linestyle='-', color='firebrick', lw=1, alpha=1, label=f"Battery {batt_num} (Fitted)")
+
+    # formats the plot
+    plt.xlabel("Battery Percentage Remaining (%)")
+    plt.ylabel("Voltage (V)")
+    plt.title(f"Battery #{batt_num} Voltage vs. Remaining Percentage")
+    plt.ylim(10, 14.8)
+    plt.legend()
+
+    # sets y-ticks every 0.3V
+    plt.yticks(np.arange(10, 15 + 0.3, 0.3))
+
+    # sets x-ticks from 100% to 0% in steps of 10%
+    plt.xticks(np.arange(0, 110, 10), labels=[f"{100 - int(tick):d}%" for tick in np.arange(0, 110, 10)])
+    return fig
+
+
+@profiled("master voltage figure")
+def master_voltage_figure(log_files, interactive=False):
+    """
+    Fitted voltage over time of every log on one figure (master_voltage_plotter.py).
+    With interactive, each line is redrawn from its level-of-detail pyramid when the view is
+    panned or zoomed, down to one point per second.
+    """
+    plt.style.use('bmh')  # for style ;)
+    fig = plt.figure(figsize=(12, 6))
+    points = screen_points(fig)  # points kept per line, one per pixel of width
+
+    colors_raw = plt.cm.spring(np.linspace(0, 1, len(log_files)))  # colors for raw data
+    colors_fit = plt.cm.winter(np.linspace(0, 1, len(log_files)))  # contrasting colors for fitted lines
+
+    max_time = 0  # tracks max duration for x-axis scaling
+
+    for i, log_file in enumerate(log_files):
+        # Read space-separated file (stops at 0.0 and scales voltage to match battery voltage)
+        timestamps, voltages = load_log(log_file)
+        timestamps = timestamps / 60  # converts time to minutes
+
+        # skips empty files
+        if not timestamps.size:
+            continue
+
+        # shifts timestamps so the last recorded time is zero (nice!)
+        end_time = timestamps[-1]  # defines the last timestamp of this dataset
+        timestamps = timestamps - end_time  # shifts so the last time is at 0
+
+        # keeps track of the max duration for x-axis scaling
+        max_time = max(max_time, abs(timestamps[0]))  # stores longest time before reaching 0
+
+        # computes a fit curve along the average trend using a moving average (each point placed at the centre of its window)
+        window_size = 41  # must be an odd number for symmetry
+        fit_timestamps, fit_voltages = fit_curve(timestamps, voltages, window_size)
+
+        if interactive:
+            # plots the smoothed fit curve at the detail the current view needs
+            LODLine(plt.gca(), fit_timestamps, fit_voltages, load_pyramid(log_file, fit_voltages, f"fit{window_size}"),
+                    linestyle='-', color=colors_fit[i], lw=2.0, alpha=1, label=f"Battery {i+1} (Fitted)")
+            continue
+
+        # downsamples to the figure width (min/max keeps voltage sags, LTTB keeps the fit's shape)
+        timestamps, voltages = minmax(timestamps, voltages, points)
+        fit_timestamps, fit_voltages = lttb(fit_timestamps, fit_voltages, points)
+
+        # plots raw voltage data (if you want to)
+        #plt.plot(timestamps, voltages, marker='.', linestyle='-',
+        #          color=colors_raw[i], alpha=0.5, lw=0.8, label=f"Battery {i+1}")
+
+        # plots the smoothed fit curve
+        plt.plot(fit_timestamps, fit_voltages, linestyle='-',
+                 color=colors_fit[i], lw=2.0, alpha=1, label=f"Battery {i+1} (Fitted)")
+
+    # formats the plot
+    plt.xlabel("Time (min)")
+    plt.ylabel("Voltage (V)")
+    plt.title("Battery Voltage Over Time")
+    plt.ylim(10, 14.8)
+    plt.legend()
+
+    # sets y-ticks every 0.3V
+    plt.yticks(np.arange(10, 15 + 0.3, 0.3))
+
+    if interactive:
+        # ticks follow the zoom, labelled as positive minutes like the fixed ones
+        plt.gca().xaxis.set_major_formatter(FuncFormatter(lambda tick, _: f"{abs(tick):g}"))
+        return fig
+
+    # generates x-ticks dynamically (using negative-to-zero scale, but labels as positive)
+    xticks = np.linspace(-max_time, 0, num=10)
+    plt.xticks(xticks, labels=[f"{int(abs(tick))}" for tick in xticks])
+    return fig
+
+
+@profiled("master Ah figure")
+def master_Ah_figure(log_files, interactive=False):
+    """
+    Voltage vs. remaining charge of every log on one figure (master_Ah_plotter.py).
+    With interactive, each line is redrawn from its level-of-detail pyramid when the view is
+    panned or zoomed, down to one point per second.
+    """
+    plt.style.use('bmh')  # for style ;)
+    fig = plt.figure(figsize=(12, 6))
+    points = screen_points(fig)  # points kept per line, one per pixel of width
+
+    colors_raw = plt.cm.spring(np.linspace(0, 1, len(log_files)))  # colors for raw data
+    colors_fit = plt.cm.winter(np.linspace(0, 1, len(log_files)))  # contrasting colors for fitted lines
+
+    for i, log_file in enumerate(log_files):
+        # Read space-separated file (stops at 0.0 and scales voltages back)
+        timestamps, voltages = load_log(log_file)
+
+        # Skip empty files
+        if not timestamps.size:
+            continue
+
+        # computes remaining Ah (starts at max Ah and decreases)
+        Ah_remaining = remaining_Ah(log_file)
+
+        # computes a fit curve along the average trend (each point placed at the centre of its window)
+        window_size = 21  # Keep it an odd number for symmetry
+        fit_Ah_remaining, fit_voltages = fit_curve(Ah_remaining, voltages, window_size)
+
+        if interactive:
+            # plots raw and fitted voltage at the detail the current view needs
+            ax = plt.gca()
+            LODLine(ax, Ah_remaining, voltages, load_pyramid(log_file, voltages, "voltage"), marker='.',
+                    linestyle='-', color=colors_raw[i], alpha=0.5, lw=0.8, label=f"Battery {i+1}")
+            LODLine(ax, fit_Ah_remaining, fit_voltages, load_pyramid(log_file, fit_voltages, f"fit{window_size}"),
+                    linestyle='-', color=colors_fit[i], lw=2.0, alpha=1, label=f"Battery {i+1} (Fitted)")
+            continue
+
+        # downsamples to the figure width (min/max keeps voltage sags, LTTB keeps the fit's shape)
+        Ah_remaining, voltages = minmax(Ah_remaining, voltages, points)
+        fit_Ah_remaining, fit_voltages = lttb(fit_Ah_remaining, fit_voltages, points)
+
+        # plots raw voltage data
+        plt.plot(Ah_remaining, voltages, marker='.', linestyle='-',
+                 color=colors_raw[i], alpha=0.5, lw=0.8, label=f"Battery {i+1}")
+
+        # plots smoothed fit curve
+        plt.plot(fit_Ah_remaining, fit_voltages, linestyle='-',
+                 color=colors_fit[i], lw=2.0, alpha=1, label=f"Battery {i+1} (Fitted)")
+
+    # formats the plot
+    plt.xlabel("Remaining Charge (Ah)")
+    plt.ylabel("Voltage (V)")
+    plt.title("Battery Voltage vs. Remaining Charge")
+    plt.ylim(10, 14.8)
+    #plt.legend()
+
+    # sets y-ticks every 0.3V
+    plt.yticks(np.arange(10, 15 + 0.3, 0.3))
+
+    # flips x-axis since Ah decreases over time
+    plt.gca().invert_xaxis()
+    return fig
+
+
+@profiled("master percent figure")
+def master_percent_figure(log_files):
+    """
+    Voltage vs. remaining percentage of every log on one figure (master_battery%_plotter.py).
+    """
+    plt.style.use('bmh')  # for style ;)
+    fig = plt.figure(figsize=(12, 6))
+    points = screen_points(fig)  # points kept per line, one per pixel of width
+
+    colors_raw = plt.cm.spring(np.linspace(0, 1, len(log_files)))  # colors for raw data
+    colors_fit = plt.cm.winter(np.linspace(0, 1, len(log_files)))  # contrasting colors for fitted lines
+
+    for i, log_file in enumerate(log_files):
+        # Read space-separated file (stops at 0.0 and scales voltage to match battery voltage)
+        timestamps, voltages = load_log(log_file)
+
+        # skips empty files
+        if not timestamps.size:
+            continue
+
+        # normalizes timestamps
+        start_time = timestamps[0]
+        end_time = timestamps[-1]
+        normalized_time = np.zeros(len(timestamps))  # a one-sample log (no duration) sits at 0%
+        if end_time > start_time:
+            normalized_time = (timestamps - start_time) / (end_time - start_time) * 100  # converts to percentage
+
+        # computes a fit curve along the average trend (each point placed at the centre of its window)
+        window_size = 21  # keeps it an odd number for symmetry
+        fit_timestamps, fit_voltages = fit_curve(normalized_time, voltages, window_size)
+
+        # downsamples to the figure width (min/max keeps voltage sags, LTTB keeps the fit's shape)
+        normalized_time, voltages = minmax(normalized_time, voltages, points)
+        fit_timestamps, fit_voltages = lttb(fit_timestamps, fit_voltages, points)
+
+        # plots raw voltage data
+        plt.plot(normalized_time, voltages, marker='.', linestyle='-',
+                 color=colors_raw[i], alpha=0.5, lw=0.8, label=f"Battery {i+1}")
+
+        # plots smoothed fit curve
+        plt.plot(fit_timestamps, fit_voltages, linestyle='-',
+                 color=colors_fit[i], lw=2.0, alpha=1, label=f"Battery {i+1} (Fitted)")
+
+    # formats the plot
+    plt.xlabel("Battery Percentage Remaining (%)")
+    plt.ylabel("Voltage (V)")
+    plt.title("Battery Voltage vs. Remaining Percentage")
+    plt.ylim(10, 14.8)
+    #plt.ylim(12.8, 13.5)
+    plt.legend()
+
+    # sets y-ticks every 0.3V
+    plt.yticks(np.arange(10, 15 + 0.3, 0.3))
+
+    # sets x-ticks from 100% to 0% in steps of 10%
+    plt.xticks(np.arange(0, 110, 10), labels=[f"{100 - int(tick):d}%" for tick in np.arange(0, 110, 10)])
+    return fig
+
+
+@profiled("FFT figure")
+def fft_figure(pwm_file, mppt_file, sampling_interval=None, segment_samples=SEGMENT_SAMPLES):
+    """
+    Power spectral density of the PWM and MPPT charge controller voltages (plot_fft_charge_controller.py),
+    by Welch's method on both captures resampled to one uniform rate (spectrum.py). sampling_interval is
+    the time between samples in seconds, by default estimated from the timestamps.
+    """
+    # reads data from both files
+    captures = [load_log(pwm_file), load_log(mppt_file)]
+
+    # resamples both onto one uniform grid and averages the spectra of their segments (one batched rFFT)
+    rate = None if sampling_interval is None else 1 / sampling_interval
+    freqs, psd, segments = welch(captures, rate, segment_samples)
+
+    # plots the spectra (on a log scale, the interference peaks stand out from the noise floor)
+    plt.style.use('bmh')
+    fig = plt.figure(figsize=(12, 6))
+    plt.semilogy(freqs[1:], psd[0, 1:], label=f"PWM ({segments[0]} segments)", color='royalblue', lw=1)
+    plt.semilogy(freqs[1:], psd[1, 1:], label=f"MPPT ({segments[1]} segments)", color='firebrick', alpha=0.8, lw=1)
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Power spectral density (V²/Hz)")
+    plt.title(f"Spectrum of PWM and MPPT Voltage Signals ({2 * freqs[-1]:.0f} samples/s, {freqs[1]:.3g} Hz resolution)")
+    plt.xlim(0, freqs[-1])  # up to the Nyquist frequency
+    plt.legend()
+    return fig
+
+
+def show():
+    """
+    Shows the open figures like plt.show(). When profiling, they are drawn once first, so the time
+    matplotlib takes to draw them is measured apart from the time the windows stay open.
+    """
+    if enabled():
+        with span("draw"):
+            for number in plt.get_fignums():
+                plt.figure(number).canvas.draw()
+    plt.show()
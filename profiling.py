@@ -0,0 +1,253 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource  # peak RSS; not available on Windows
+except ImportError:
+    resource = None
+
+# named timing spans, counters and memory high-water marks for the --profile option of the scripts.
+# Every helper returns straight away until enable() is called, so the hooks left in the code cost one
+# global check when profiling is off.
+MAX_EVENTS = 100000  # spans kept for the Chrome trace; the per-stage totals count every span
+
+_enabled = False
+_memory = False
+_start_ns = 0
+_stack = []  # open spans of the main thread: [name, start_ns, child_ns, child_peak, saved_peak]
+_stages = {}  # path of span names -> [calls, total_ns, self_ns, rss_bytes, peak_bytes]
+_counters = {}
+_events = []  # (path, start_ns, duration_ns) of the first MAX_EVENTS spans
+_main_thread = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if threading.current_thread() is not _main_thread:
+            self.name = None  # spans are only kept for the main thread, counters for all
+            return self
+        saved_peak = 0
+        if _memory:
+            import tracemalloc
+            saved_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        _stack.append([self.name, time.perf_counter_ns(), 0, 0, saved_peak])
+        return self
+
+    def __exit__(self, *exc):
+        if self.name is not None:
+            _close(time.perf_counter_ns())
+        return False
+
+
+def _rss_bytes():
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # bytes on macOS, KiB on Linux
+
+
+def _close(end_ns):
+    name, start_ns, child_ns, child_peak, saved_peak = _stack.pop()
+    path = tuple(entry[0] for entry in _stack) + (name,)
+    duration = end_ns - start_ns
+    peak = 0
+    if _memory:
+        import tracemalloc
+        peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+    stage = _stages.get(path)
+    if stage is None:
+        stage = _stages[path] = [0, 0, 0, 0, 0]
+    stage[0] += 1
+    stage[1] += duration
+    stage[2] += duration - child_ns
+    stage[3] = max(stage[3], _rss_bytes())
+    stage[4] = max(stage[4], peak)
+    if len(_events) < MAX_EVENTS:
+        _events.append((path, start_ns, duration))
+    if _stack:
+        parent = _stack[-1]
+        parent[2] += duration
+        parent[3] = max(parent[3], peak, saved_peak)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(memory=False):
+    """
+    Starts recording spans and counters; with memory, also the peak of Python and NumPy allocations
+    per span (tracemalloc, which slows code that allocates a lot of small objects).
+    """
+    global _enabled, _memory, _start_ns, _main_thread
+    _stages.clear()
+    _counters.clear()
+    del _events[:], _stack[:]
+    _main_thread = threading.current_thread()
+    _memory = memory
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+    _start_ns = time.perf_counter_ns()
+    _enabled = True
+
+
+def disable():
+    """
+    Stops recording (open spans are closed now) and returns the wall time since enable() in seconds.
+    """
+    global _enabled
+    end_ns = time.perf_counter_ns()
+    while _stack:
+        _close(end_ns)
+    _enabled = False
+    if _memory:
+        import tracemalloc
+        tracemalloc.stop()
+    return (end_ns - _start_ns) / 1e9
+
+
+def span(name):
+    """
+    Times the block of a with statement as the stage name, nested in the spans open around it.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def count(name, n=1):
+    """
+    Adds n to the counter name (lines parsed, samples kept, ...).
+    """
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as the stage name.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def stages(wall_s):
+    """
+    Returns the per-stage breakdown as a list of dicts, parents before their children, with the
+    time outside every span as an "(other)" stage.
+    """
+    rows = []
+    top_ns = 0
+    for path in sorted(_stages, key=lambda path: [(-_stages[path[:i + 1]][1], path[i]) for i in range(len(path))]):
+        calls, total_ns, self_ns, rss, peak = _stages[path]
+        if len(path) == 1:
+            top_ns += total_ns
+        rows.append({"stage": "/".join(path), "depth": len(path) - 1, "calls": calls, "total_s": total_ns / 1e9,
+                     "self_s": self_ns / 1e9, "rss_mb": rss / 2 ** 20, "peak_mb": peak / 2 ** 20 if _memory else None})
+    other = max(0.0, wall_s - top_ns / 1e9)
+    rows.append({"stage": "(other)", "depth": 0, "calls": 1, "total_s": other, "self_s": other,
+                 "rss_mb": _rss_bytes() / 2 ** 20, "peak_mb": None})
+    return rows
+
+
+def report(wall_s, out=None):
+    """
+    Prints the per-stage breakdown and the counters.
+    """
+    out = out or sys.stderr
+    print(f"\n{'Stage':<32} {'Calls':>7} {'Total (s)':>10} {'Self (s)':>10} {'% wall':>7} {'RSS (MB)':>9} {'Peak (MB)':>10}",
+          file=out)
+    print("=" * 91, file=out)
+    for row in stages(wall_s):
+        name = "  " * row["depth"] + row["stage"].rsplit("/", 1)[-1]
+        share = 100 * row["total_s"] / wall_s if wall_s else 0.0
+        peak = f"{row['peak_mb']:>10.1f}" if row["peak_mb"] is not None else f"{'':>10}"
+        print(f"{name:<32} {row['calls']:>7} {row['total_s']:>10.3f} {row['self_s']:>10.3f} {share:>7.1f} "
+              f"{row['rss_mb']:>9.1f} {peak}", file=out)
+    print(f"{'wall time':<32} {'':>7} {wall_s:>10.3f}", file=out)
+    for name, value in sorted(_counters.items()):
+        print(f"{name:<32} {value:>18}", file=out)
+
+
+def write(path, wall_s):
+    """
+    Writes the breakdown as JSON, or as a Chrome trace (chrome://tracing, ui.perfetto.dev) if path
+    ends in .trace.json.
+    """
+    if path.endswith(".trace.json"):
+        pid = os.getpid()
+        events = [{"name": p[-1], "cat": "/".join(p[:-1]), "ph": "X", "ts": (start - _start_ns) / 1000,
+                   "dur": duration / 1000, "pid": pid, "tid": 0} for p, start, duration in _events]
+        events += [{"name": name, "ph": "C", "ts": wall_s * 1e6, "pid": pid, "args": {name: value}}
+                   for name, value in sorted(_counters.items())]
+        data = {"traceEvents": events, "displayTimeUnit": "ms"}
+    else:
+        data = {"argv": sys.argv, "wall_s": wall_s, "stages": stages(wall_s), "counters": dict(_counters)}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1)
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="time every stage and print the breakdown when done, or write it to FILE "
+                             "(JSON, or a Chrome trace if FILE ends in .trace.json)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also measure the peak allocations of each stage (slower)")
+
+
+def note_workers(workers):
+    """
+    Tells on stderr that a profile of a run with several worker processes only times their work as a whole.
+    """
+    if _enabled and workers > 1:
+        print(f"--profile: the {workers} worker processes are not profiled, only the time waiting for them "
+              f"(pass -j 1 for a per-stage breakdown)", file=sys.stderr)
+
+
+def start(profile, memory=False):
+    """
+    Enables profiling when profile (the --profile value) is set and reports when the program
+    exits, however it exits. Worker processes (-j) are not profiled.
+    """
+    if not profile or _enabled:
+        return
+
+    def finish():
+        wall_s = disable()
+        if profile != "-":
+            write(profile, wall_s)
+            print(f"profile saved to {profile}", file=sys.stderr)
+        report(wall_s)
+
+    enable(memory)
+    atexit.register(finish)
@@ -0,0 +1,150 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+
+import matplotlib
+matplotlib.use("Agg")  # renders straight to files, no windows
+import matplotlib.pyplot as plt
+import plots
+from battery_meta import label, run_name
+from battery_summary import run_jobs, worker_count
+from profiling import add_arguments, note_workers, span, start
+
+OUT_DIR = "figures"
+MANIFEST = ".render_manifest.json"  # input hash of every figure from the last run, kept in OUT_DIR
+
+# plotting code that goes into every figure's hash, so editing it re-renders everything
+RENDER_SOURCES = ["plots.py", "battery_log.py", "battery_meta.py", "ah_index.py", "smoothing.py", "downsample.py"]
+
+# per-battery figures: name suffix -> figure function in plots.py
+BATTERY_FIGURES = {
+    "voltage": "voltage_figure",
+    "Ah": "Ah_figure",
+    "percent": "percent_figure",
+}
+MASTER_FIGURES = {
+    "master_voltage": "master_voltage_figure",
+    "master_Ah": "master_Ah_figure",
+    "master_percent": "master_percent_figure",
+}
+
+
+def figure_jobs(log_files):
+    """
+    Returns (name, figure function, args, input files) for every figure of the report.
+    """
+    jobs = []
+    for log_file in log_files:
+        batt_name = label(run_name(log_file))
+        for suffix, func in BATTERY_FIGURES.items():
+            jobs.append((f"{run_name(log_file)}_{suffix}", func, (log_file, batt_name), [log_file]))
+    for name, func in MASTER_FIGURES.items():
+        jobs.append((name, func, (log_files,), log_files))
+    return jobs
+
+
+def sources_digest():
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for source in RENDER_SOURCES:
+        with open(os.path.join(here, source), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def job_hash(job, formats, sources):
+    """
+    Hashes everything a figure depends on: its parameters, the size and mtime of its logs and the plotting code.
+    """
+    name, func, args, inputs = job
+    digest = hashlib.sha256(repr((name, func, args, sorted(formats), sources)).encode())
+    for path in inputs:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def render(task):
+    """
+    Draws one figure and saves it in every format. Returns (name, saved paths, error message).
+    """
+    (name, func, args, _), out_dir, formats = task
+    try:
+        fig = getattr(plots, func)(*args)
+    except ValueError as e:  # logs with no usable data
+        return name, [], str(e)
+    paths = [os.path.join(out_dir, f"{name}.{fmt}") for fmt in formats]
+    with span("savefig"):
+        for path in paths:
+            fig.savefig(path)
+    plt.close(fig)
+    return name, paths, None
+
+
+def render_all(log_files, out_dir=OUT_DIR, formats=("png",), workers=1, force=False):
+    """
+    Renders every figure whose inputs changed since the last run and returns (rendered, skipped) names.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    sources = sources_digest()
+    todo, skipped, hashes = [], [], {}
+    for job in figure_jobs(log_files):
+        name = job[0]
+        hashes[name] = job_hash(job, formats, sources)
+        entry = manifest.get(name)
+        if (not force and entry and entry["hash"] == hashes[name]
+                and all(os.path.exists(path) for path in entry["outputs"])):
+            skipped.append(name)
+        else:
+            todo.append((job, out_dir, formats))
+
+    rendered = []
+    for name, paths, error in run_jobs(render, todo, workers):
+        if error:
+            print(f"{name}: {error}")
+            manifest.pop(name, None)  # so the next run tries it again
+            continue
+        manifest[name] = {"hash": hashes[name], "outputs": paths}
+        rendered.append(name)
+
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return rendered, skipped
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Render every battery plot to image files without opening windows.")
+    parser.add_argument("--out", default=OUT_DIR, help=f"output folder (default: {OUT_DIR})")
+    parser.add_argument("--format", nargs="+", default=["png"], choices=["png", "svg", "pdf"],
+                        help="image formats to save (default: png)")
+    parser.add_argument("-j", "--workers", type=worker_count,
+                        help="number of worker processes (default 0 = one per CPU core, 1 with --profile)")
+    parser.add_argument("--force", action="store_true", help="re-render figures even if their inputs are unchanged")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+    if args.workers is None:
+        args.workers = 1 if args.profile else os.cpu_count() or 1  # worker processes aren't profiled
+    workers = args.workers
+    note_workers(workers)
+
+    started = time.perf_counter()
+    log_files = sorted(glob.glob("battery*_out.text"))
+    rendered, skipped = render_all(log_files, args.out, args.format, workers, args.force)
+    print(f"Rendered {len(rendered)} figures, skipped {len(skipped)} unchanged, "
+          f"in {time.perf_counter() - started:.1f} s. Saved to {args.out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import numpy as np
+from profiling import profiled
+
+# kernels longer than this are applied with an FFT instead of np.convolve
+FFT_MIN_KERNEL = 64
+
+
+def _window_sums(values, window_size):
+    """
+    Returns the sums of every full window of values in O(n) using a cumulative sum.
+    The values are offset by their mean first so long logs don't lose precision in the running total.
+    """
+    offset = values.mean()
+    csum = np.concatenate(([0.0], np.cumsum(values - offset)))
+    return csum[window_size:] - csum[:-window_size] + offset * window_size
+
+
+def _pad(values, window_size, mode):
+    if mode == "valid":
+        return values
+    if mode == "same":
+        # zero padding on both sides, as np.convolve(..., mode='same') does
+        half = window_size // 2
+        return np.concatenate((np.zeros(half), values, np.zeros(window_size - 1 - half)))
+    raise ValueError(f"mode must be 'same' or 'valid', not {mode!r}")
+
+
+@profiled("smooth")
+def moving_average(values, window_size, mode="same"):
+    """
+    Moving average of values in O(n) for any window size.
+    mode='valid' returns only the len(values) - window_size + 1 averages over full windows.
+    mode='same' returns one average per value, centred on it, with zeros beyond both ends
+    (the same numbers as np.convolve(values, np.ones(window_size) / window_size, mode='same')).
+    """
+    values = np.asarray(values, dtype=float)
+    window_size = max(1, int(window_size))
+    values = _pad(values, window_size, mode)
+    if len(values) < window_size:
+        return np.empty(0)
+    return _window_sums(values, window_size) / window_size
+
+
+def _convolve(values, kernel):
+    """
+    'valid' convolution of values with kernel, using an FFT for long kernels.
+    """
+    if len(kernel) < FFT_MIN_KERNEL:
+        return np.convolve(values, kernel, mode='valid')
+    size = len(values) + len(kernel) - 1
+    full = np.fft.irfft(np.fft.rfft(values, size) * np.fft.rfft(kernel, size), size)
+    return full[len(kernel) - 1:len(values)]
+
+
+@profiled("smooth")
+def savgol(values, window_size, polyorder=2, mode="same"):
+    """
+    Savitzky-Golay filter: the value at the centre of a least-squares polynomial fit over each window.
+    Keeps peaks and knees of the discharge curve sharper than a moving average of the same width.
+    window_size must be odd; mode works as in moving_average.
+    """
+    if window_size % 2 == 0:
+        raise ValueError("window_size must be odd for a Savitzky-Golay filter")
+    if polyorder >= window_size:
+        raise ValueError("polyorder must be less than window_size")
+    values = _pad(np.asarray(values, dtype=float), window_size, mode)
+    if len(values) < window_size:
+        return np.empty(0)
+    half = window_size // 2
+    positions = np.vander(np.arange(-half, half + 1), polyorder + 1, increasing=True)
+    kernel = np.linalg.pinv(positions)[0]  # symmetric, so no need to flip it for convolution
+    return _convolve(values, kernel)
+
+
+@profiled("smooth")
+def exponential(values, alpha):
+    """
+    Exponential moving average y[i] = alpha * values[i] + (1 - alpha) * y[i - 1], starting at values[0].
+    Runs in blocks with a closed-form sum, so there is no Python loop over samples.
+    """
+    values = np.asarray(values, dtype=float)
+    if not 0 < alpha <= 1:
+        raise ValueError("alpha must be in (0, 1]")
+    decay = 1.0 - alpha
+    if not values.size or decay == 0:
+        return values.copy()
+
+    # decay ** -block must stay well inside the float range
+    block = max(1, int(500 / -np.log(decay)))
+    out = np.empty_like(values)
+    previous = values[0]
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        out[start:start + len(chunk)] = powers * (previous + alpha * np.cumsum(chunk / powers))
+        previous = out[start + len(chunk) - 1]
+    return out
+
+
+def fit_curve(x, values, window_size, method="moving_average", polyorder=2):
+    """
+    Smooths values and returns (fit_x, fit_values) for plotting. Only full windows are used and
+    each fitted value is placed at the x of its window's centre, so no edge trimming is needed.
+    method is "moving_average" or "savgol".
+    """
+    if method == "moving_average":
+        fit_values = moving_average(values, window_size, mode="valid")
+    elif method == "savgol":
+        fit_values = savgol(values, window_size, polyorder, mode="valid")
+    else:
+        raise ValueError(f"unknown smoothing method {method!r}")
+    half = (max(1, int(window_size)) - 1) // 2
+    return np.asarray(x)[half:half + len(fit_values)], fit_values
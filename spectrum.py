@@ -0,0 +1,167 @@
+import argparse
+import csv
+import numpy as np
+from battery_log import load_log
+from profiling import add_arguments, profiled, span, start
+
+# Welch power spectral density of charge controller captures (RFI_test.py, usb_frames.py).
+# The Pico timestamps each read itself, so the samples are jittery and the captures have gaps where it
+# stopped to print or collect garbage: every capture is resampled onto a uniform grid between the gaps,
+# cut into overlapping windowed segments, and all segments of all captures go through one batched rFFT.
+SEGMENT_SAMPLES = 256  # samples per Welch segment (RFI_test.py captures come in ~390-sample stretches between gaps)
+OVERLAP = 0.5  # fraction of each segment shared with the next
+GAP_FACTOR = 5  # samples further apart than this many typical intervals are a gap, not jitter
+BLOCK_SEGMENTS = 256  # segments transformed per rFFT call, so long captures don't need one huge array
+PEAKS = 5  # strongest peaks listed per capture
+
+
+def sample_interval(timestamps):
+    """
+    Typical time between samples of a capture: the median interval, which jitter and gaps hardly move.
+    """
+    steps = np.diff(np.asarray(timestamps, dtype=float))
+    steps = steps[steps > 0]
+    if not steps.size:
+        raise ValueError("need at least two increasing timestamps to estimate the sample rate")
+    return float(np.median(steps))
+
+
+def uniform_pieces(timestamps, values, interval, gap_factor=GAP_FACTOR):
+    """
+    Resamples a capture onto a uniform grid of interval seconds by linear interpolation (which damps
+    the top of the band a little: about 10% of the power at an eighth of the rate). The capture is
+    split where samples are more than gap_factor intervals apart, so no piece interpolates across a gap.
+    Returns the list of resampled pieces.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+    breaks = np.flatnonzero(np.diff(timestamps) > gap_factor * interval) + 1
+    pieces = []
+    for t, v in zip(np.split(timestamps, breaks), np.split(values, breaks)):
+        if len(t) < 2:
+            continue
+        grid = t[0] + interval * np.arange(int((t[-1] - t[0]) / interval) + 1)
+        pieces.append(np.interp(grid, t, v))
+    return pieces
+
+
+def hann(n):
+    # periodic Hann window, the usual one for spectral estimates (np.hanning is the symmetric one)
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)
+
+
+def _segment_blocks(segments, block_segments):
+    """
+    Yields (capture index of each row, rows) in blocks of about block_segments rows, where segments
+    holds one 2-D strided view of segments per capture.
+    """
+    ids, rows, size = [], [], 0
+    for k, view in enumerate(segments):
+        for first in range(0, len(view), block_segments):
+            part = view[first:first + block_segments]
+            ids.append(np.full(len(part), k))
+            rows.append(part)
+            size += len(part)
+            if size >= block_segments:
+                yield np.concatenate(ids), np.concatenate(rows)
+                ids, rows, size = [], [], 0
+    if rows:
+        yield np.concatenate(ids), np.concatenate(rows)
+
+
+@profiled("welch")
+def welch(captures, rate=None, segment_samples=SEGMENT_SAMPLES, overlap=OVERLAP, gap_factor=GAP_FACTOR,
+          block_segments=BLOCK_SEGMENTS):
+    """
+    Welch power spectral density of several captures at once, each a (timestamps, values) pair.
+    All of them are resampled to one rate in Hz (by default the lowest estimated from their timestamps,
+    so none is interpolated much finer than it was sampled; there is no anti-alias filter, so captures
+    taken at very different rates are better analysed in separate calls) and cut into Hann-windowed segments of
+    segment_samples (fewer if no piece between gaps is that long) overlapping by overlap; the segments'
+    mean is removed. Returns (frequencies, psd, segments): psd has one row per capture in units**2/Hz,
+    one-sided, and is NaN for captures too short for a single segment.
+    """
+    if rate is None:
+        rate = 1 / max(sample_interval(t) for t, _ in captures)
+    with span("resample"):
+        pieces = [uniform_pieces(t, v, 1 / rate, gap_factor) for t, v in captures]
+    longest = max((len(piece) for capture in pieces for piece in capture), default=0)
+    nperseg = min(segment_samples, longest)
+    if nperseg < 8:
+        raise ValueError("captures are too short for a spectrum")
+    step = max(1, int(round(nperseg * (1 - overlap))))
+
+    segments = []
+    for capture in pieces:
+        views = [np.lib.stride_tricks.sliding_window_view(piece, nperseg)[::step]
+                 for piece in capture if len(piece) >= nperseg]
+        segments.append(np.concatenate(views) if views else np.empty((0, nperseg)))
+    counts = np.array([len(view) for view in segments])
+
+    window = hann(nperseg)
+    totals = np.zeros((len(captures), nperseg // 2 + 1))
+    for ids, rows in _segment_blocks(segments, block_segments):
+        rows = (rows - rows.mean(axis=1, keepdims=True)) * window
+        with span("rfft"):
+            spectra = np.fft.rfft(rows, axis=1)
+        power = spectra.real ** 2 + spectra.imag ** 2
+        starts = np.flatnonzero(np.diff(ids, prepend=-1))  # rows are grouped by capture
+        totals[ids[starts]] += np.add.reduceat(power, starts, axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        psd = totals / counts[:, None] / (rate * np.sum(window ** 2))
+    psd[:, 1:nperseg - nperseg // 2] *= 2  # one-sided: every bin but DC (and Nyquist for even lengths) twice
+    return np.fft.rfftfreq(nperseg, 1 / rate), psd, counts
+
+
+def peaks(frequencies, psd, count=PEAKS):
+    """
+    Returns (frequency, psd) of the count strongest local maxima of one spectrum, DC left out.
+    """
+    inner = np.flatnonzero((psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])) + 1
+    strongest = inner[np.argsort(psd[inner])[::-1][:count]]
+    return [(float(frequencies[i]), float(psd[i])) for i in strongest]
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Power spectral density of charge controller captures by Welch's method.")
+    parser.add_argument("files", nargs="+", help='captures of "<seconds> <sensor_value>" lines (e.g. pwm_test0.text mppt_test0.text)')
+    parser.add_argument("--rate", type=float, help="sample rate in Hz to resample to (default: estimated from the timestamps)")
+    parser.add_argument("--segment", type=int, default=SEGMENT_SAMPLES,
+                        help=f"samples per segment; the frequency resolution is the rate / segment (default: {SEGMENT_SAMPLES})")
+    parser.add_argument("--overlap", type=float, default=OVERLAP, help=f"overlap of the segments (default: {OVERLAP})")
+    parser.add_argument("-o", "--out", help="save the spectra as CSV (frequency, then one column per capture)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    captures = [load_log(file, cache=False) for file in args.files]
+    try:
+        rate = args.rate or 1 / max(sample_interval(t) for t, _ in captures)
+        frequencies, psd, segments = welch(captures, rate, args.segment, args.overlap)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"resampled to {rate:.1f} samples/s, {frequencies[1]:.3g} Hz resolution\n")
+    for file, (timestamps, _), row, count in zip(args.files, captures, psd, segments):
+        interval = sample_interval(timestamps)
+        jitter = np.std(np.diff(timestamps)[np.diff(timestamps) <= GAP_FACTOR * interval])
+        print(f"{file}: {len(timestamps)} samples, {1 / interval:.1f} samples/s measured "
+              f"(jitter {jitter * 1e6:.0f} us), {count} segments")
+        if not count:
+            continue
+        for frequency, value in peaks(frequencies, row):
+            print(f"    {frequency:>10.1f} Hz  {value:.3g} V^2/Hz")
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Frequency (Hz)"] + [f"{file} PSD (V^2/Hz)" for file in args.files])
+            writer.writerows(np.column_stack((frequencies, psd.T)).tolist())
+        print(f"\nspectra saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
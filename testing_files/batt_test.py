@@ -1,5 +1,6 @@
 from machine import Pin, ADC
-from time import sleep, time
+from time import sleep_ms, ticks_add, ticks_diff, ticks_ms
+from array import array
 import os
 
 analogue_input = ADC(Pin(26))  # ADC pin
@@ -7,48 +8,131 @@ RESISTANCE = 5  # ohms per resistor
 LOG_FILE = "/voltages.csv"
 TRANSFER_SIGNAL = "/transfer.lock"  # signal file from pi
 SAMPLE_INTERVAL = 1  # seconds
-elapsed_time = 0  # persistent time counter
+
+# samples are kept in RAM and written to flash in blocks, so the flash is written (and synced) once per
+# FLUSH_LINES samples or FLUSH_INTERVAL seconds, whichever comes first; a power cut loses at most that much
+FLUSH_LINES = 64
+FLUSH_INTERVAL = 30  # seconds
+# while transfer.lock exists the block waits in RAM and sampling carries on; if a transfer outlasts
+# BUFFER_LINES samples the oldest unwritten ones are dropped (and counted)
+BUFFER_LINES = 1024
+STATUS_INTERVAL = 1  # seconds between "Logged voltage" prints
+NO_BATTERY = 65535  # full-scale reading (16.5 V), a false reading from no battery
+
 
 # function that formats elapsed time for display
 def format_time(seconds):
+    seconds = int(seconds)
     days = seconds // 86400
     hours = (seconds % 86400) // 3600
     minutes = (seconds % 3600) // 60
     sec = seconds % 60
     return f"{days}d {hours}h {minutes}m {sec}s"
 
-# ensures the file exists and writes a header if necessary
-if LOG_FILE not in os.listdir():
-    with open(LOG_FILE, "w") as f:
-        f.write("Elapsed Time (s),Voltage (V)\n")
-
-try:
-    while True:
-        # checks if transfer signal file exists
-        if TRANSFER_SIGNAL in os.listdir():
-            print("⚡ Data transfer in progress... Pausing logging temporarily.")
-            sleep(SAMPLE_INTERVAL)  # avoids writing while transfer is happening
-            continue
-
-        sensor_value = analogue_input.read_u16()  # reads sensor value
-        voltage = sensor_value * (3.3 / 65535) * RESISTANCE  # converts ADC value to voltage
-
-        # stops logging if voltage == 16.500 (false reading from no battery)
-        if voltage == 16.500:
-            voltage = 0
-            print("Battery is discharged or disconnected. Stopping program.")
-            break
-
-        formatted_time = format_time(elapsed_time)  # formats for display only
-
-        # appends data to CSV (keeping seconds for plotting)
-        with open(LOG_FILE, "a") as f:
-            f.write("{:.3f},{:.3f}\n".format(elapsed_time, voltage))  # stores elapsed_time in seconds
-            f.flush()
-            os.sync()  # ensures data is written immediately
-
-        print("Logged voltage: {:.3f}V at {}".format(voltage, formatted_time))  # displays formatted time
-        sleep(SAMPLE_INTERVAL)
-        elapsed_time += SAMPLE_INTERVAL
-except KeyboardInterrupt:
-    print("Program interrupted. Exiting gracefully.")
+
+def to_voltage(code):
+    return code * (3.3 / 65535) * RESISTANCE  # converts ADC value to voltage
+
+
+class SampleBuffer:
+    """
+    Ring buffer of raw ADC codes (2 bytes each, allocated once). Sample k was taken at
+    k * sample_interval seconds, so only the index of the oldest unwritten sample is kept.
+    """
+
+    def __init__(self, size=BUFFER_LINES):
+        self.codes = array("H", [0] * size)
+        self.start = 0  # index of the oldest unwritten sample
+        self.count = 0
+        self.dropped = 0
+
+    def append(self, code):
+        size = len(self.codes)
+        if self.count == size:  # full: the oldest sample is overwritten
+            self.start += 1
+            self.count -= 1
+            self.dropped += 1
+        self.codes[(self.start + self.count) % size] = code
+        self.count += 1
+
+    def write(self, f, sample_interval):
+        """
+        Writes every buffered sample as "elapsed,voltage" lines and empties the buffer.
+        """
+        size = len(self.codes)
+        for i in range(self.count):
+            index = self.start + i
+            f.write("{:.3f},{:.3f}\n".format(index * sample_interval, to_voltage(self.codes[index % size])))
+        self.start += self.count
+        self.count = 0
+
+
+def transfer_in_progress(lock=TRANSFER_SIGNAL):
+    try:
+        os.stat(lock)  # one lookup instead of listing the whole directory
+        return True
+    except OSError:
+        return False
+
+
+def flush(buffer, log_file=LOG_FILE, sample_interval=SAMPLE_INTERVAL):
+    with open(log_file, "a") as f:
+        buffer.write(f, sample_interval)
+    os.sync()  # ensures the block is on flash
+
+
+def log(log_file=LOG_FILE, sample_interval=SAMPLE_INTERVAL, flush_lines=FLUSH_LINES,
+        flush_interval=FLUSH_INTERVAL, buffer_lines=BUFFER_LINES, lock=TRANSFER_SIGNAL, max_samples=None):
+    """
+    Samples every sample_interval seconds until the battery reads as disconnected (or max_samples
+    have been taken), writing to log_file in blocks. Returns the buffer, for its counters.
+    """
+    # ensures the file exists and writes a header if necessary
+    try:
+        os.stat(log_file)
+    except OSError:
+        with open(log_file, "w") as f:
+            f.write("Elapsed Time (s),Voltage (V)\n")
+
+    buffer = SampleBuffer(buffer_lines)
+    interval_ms = int(sample_interval * 1000)
+    next_sample = last_flush = last_status = ticks_ms()
+    try:
+        while max_samples is None or buffer.start + buffer.count < max_samples:
+            sensor_value = analogue_input.read_u16()  # reads sensor value
+
+            # stops logging on a full-scale reading (false reading from no battery)
+            if sensor_value == NO_BATTERY:
+                print("Battery is discharged or disconnected. Stopping program.")
+                break
+
+            buffer.append(sensor_value)
+            now = ticks_ms()
+            if ticks_diff(now, last_status) >= STATUS_INTERVAL * 1000:
+                elapsed = (buffer.start + buffer.count - 1) * sample_interval
+                print("Logged voltage: {:.3f}V at {}".format(to_voltage(sensor_value), format_time(elapsed)))
+                last_status = now
+
+            if (buffer.count >= flush_lines or ticks_diff(now, last_flush) >= flush_interval * 1000) \
+                    and not transfer_in_progress(lock):
+                flush(buffer, log_file, sample_interval)
+                last_flush = now
+
+            # sleeps until the next sample is due, so slow flushes don't stretch the interval
+            next_sample = ticks_add(next_sample, interval_ms)
+            wait = ticks_diff(next_sample, ticks_ms())
+            if wait > 0:
+                sleep_ms(wait)
+            else:
+                next_sample = ticks_ms()  # fell behind: start counting again from now
+    except KeyboardInterrupt:
+        print("Program interrupted. Exiting gracefully.")
+    finally:
+        flush(buffer, log_file, sample_interval)  # keeps what was still in RAM
+        if buffer.dropped:
+            print("{} samples were dropped while a transfer held the lock.".format(buffer.dropped))
+    return buffer
+
+
+if __name__ == "__main__":
+    log()
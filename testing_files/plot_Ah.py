@@ -1,42 +1,29 @@
 import matplotlib.pyplot as plt
+import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for battery_log.py
+from battery_log import load_log
 
 LOG_FILE = "battery3_out.text"
 RESISTANCE = 5  # Ohms
 SAMPLE_INTERVAL = 1  # seconds
 interval_hours = SAMPLE_INTERVAL / 3600  # converts sample interval to hours
 
-# lists used to store data
-timestamps = []
-voltages = []
-
-# reads space-separated file (text)
-with open(LOG_FILE, "r") as f:
-    for line in f:
-        try:
-            t, v = map(float, line.split())
-            if v == 0.0:
-                break  # stops reading further once voltage is 0.0
-            timestamps.append(t / 60)
-            voltages.append(v * 3.3)
-        except ValueError:
-            continue  # skips any fucked up lines
+# reads space-separated file (stops at 0.0, skips any fucked up lines)
+timestamps, voltages = load_log(LOG_FILE, scale=3.3)
+timestamps = timestamps / 60  # converts time to minutes
 
 # normalizes timestamps by setting first timestamp to 0
-if timestamps:
-    start_time = timestamps[0]
-    timestamps = [t - start_time for t in timestamps]
+if timestamps.size:
+    timestamps = timestamps - timestamps[0]
 
 # converts voltage to current using Ohm's law: I = V / R
-currents = [v / RESISTANCE for v in voltages]
-
-# calculates cumulative ampere-hours (Ah)
-cumulative_Ah = []
-total_Ah = 0.0
-for current in currents:
-    # incremental charge for this sample
-    delta_Ah = current * interval_hours
-    total_Ah += delta_Ah
-    cumulative_Ah.append(total_Ah)
+currents = voltages / RESISTANCE
+
+# calculates cumulative ampere-hours (Ah), one sample interval of current at a time
+cumulative_Ah = np.cumsum(currents * interval_hours)
 
 # plots the cumulative Ah
 plt.style.use('bmh')
@@ -1,5 +1,10 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for battery_log.py
+from battery_log import load_log
 
 LOG_FILE = "battery2_out.text"
 RESISTANCE = 5  # Ohms
@@ -7,43 +12,20 @@ SAMPLE_INTERVAL = 1  # seconds
 interval_hours = SAMPLE_INTERVAL / 3600  # Converts sample interval to hours
 BATTERY_CAPACITY_AH = 100  # Total battery capacity in Ah
 
-# Lists used to store data
-timestamps = []
-voltages = []
-
-# Read space-separated file (text)
-with open(LOG_FILE, "r") as f:
-    for line in f:
-        try:
-            t, v = map(float, line.split())
-            if v == 0.0:
-                break  # Stop reading further once voltage is 0.0
-            timestamps.append(t / 60)  # Convert seconds to minutes
-            voltages.append(v * 3.3)  # Ensure proper ADC scaling if necessary
-        except ValueError:
-            continue  # Skip any malformed lines
+# Read space-separated file (stops at 0.0, skips malformed lines; ensure proper ADC scaling if necessary)
+timestamps, voltages = load_log(LOG_FILE, scale=3.3)
+timestamps = timestamps / 60  # Convert seconds to minutes
 
 # Normalize timestamps by setting first timestamp to 0
-if timestamps:
-    start_time = timestamps[0]
-    timestamps = [t - start_time for t in timestamps]
+if timestamps.size:
+    timestamps = timestamps - timestamps[0]
 
 # Convert voltage to current using Ohm’s Law: I = V / R
-currents = [v / RESISTANCE for v in voltages]
-
-# Compute cumulative Ampere-hours (Ah) and remaining battery capacity
-cumulative_Ah = []
-remaining_capacity = []
-total_Ah = 0.0
+currents = voltages / RESISTANCE
 
-for current in currents:
-    # Incremental charge for this sample
-    delta_Ah = current * interval_hours
-    total_Ah += delta_Ah
-    cumulative_Ah.append(total_Ah)
-    
-    # Calculate remaining capacity as a percentage
-    remaining_capacity.append(100 - (total_Ah / BATTERY_CAPACITY_AH * 100))
+# Compute cumulative Ampere-hours (Ah) and remaining battery capacity as a percentage
+cumulative_Ah = np.cumsum(currents * interval_hours)
+remaining_capacity = 100 - (cumulative_Ah / BATTERY_CAPACITY_AH * 100)
 
 # Plot the remaining battery capacity
 plt.style.use('bmh')
@@ -1,37 +1,29 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for smoothing.py, battery_log.py
+from battery_log import load_log
+from smoothing import fit_curve
 
 LOG_FILE = "battery1_out.text"
 RESISTANCE = 5  # Ohms
 
-# creates lists used to store data
-timestamps = []
-voltages = []
-
-# reads space-separated file (text)
-with open(LOG_FILE, "r") as f:
-    for line in f:
-        try:
-            t, v = map(float, line.split())
-            if v == 0.0:
-                break  # stops reading further once voltage is 0.0
-            timestamps.append(t / 60)  # converts time to minutes
-            voltages.append(v * 3.3 * 5)  # scales voltage to match battery voltage
-        except ValueError:
-            continue  # skips any fucked up lines
+# reads space-separated file (stops at 0.0, skips any fucked up lines, scales voltage to match battery voltage)
+timestamps, voltages = load_log(LOG_FILE)
+timestamps = timestamps / 60  # converts time to minutes
 
 # normalizes the timestamps by setting the first timestamp as 0
-if timestamps:
-    start_time = timestamps[0]  # first timestamp
-    timestamps = [t - start_time for t in timestamps]  # adjusts all timestamps accordingly
+if timestamps.size:
+    timestamps = timestamps - timestamps[0]
 
 # converts voltage to current using Ohm’s Law: I = V / R
-currents = [v / RESISTANCE for v in voltages]
+currents = voltages / RESISTANCE
 
 # computes a fit curve along the average trend
 window_size = max(1, len(currents) // 20)  # defines a smoothing window size
-fit_currents = np.convolve(currents, np.ones(window_size)/window_size, mode='valid')
-fit_timestamps = timestamps[:len(fit_currents)]  # adjusts timestamps accordingly
+fit_timestamps, fit_currents = fit_curve(timestamps, currents, window_size)  # O(n) even for this wide window
 
 # plots the current data
 plt.style.use('bmh')
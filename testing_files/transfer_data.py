@@ -0,0 +1,162 @@
+import argparse
+import binascii
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for profiling.py
+from profiling import add_arguments, count, span, start
+
+# pulls only what batt_test.py appended to voltages.csv since the last transfer, instead of copying the
+# whole file every minute; the local copy's size is the offset reached so far
+PICO_FILE = "/voltages.csv"
+DEST_DIR = os.path.expanduser("~/battery_test/batt_data")
+TRANSFER_SIGNAL = "/transfer.lock"  # batt_test.py pauses logging while this file exists
+PORT = "/dev/ttyACM0"
+INTERVAL = 60  # seconds between transfers
+MAX_CHUNK = 16384  # bytes per read on the Pico (sent as hex, so about twice that over USB)
+ANCHOR = 32  # bytes before the offset that are read again to check the Pico file still continues the local copy
+
+# runs on the Pico (and unchanged under CPython for LocalDevice): holds the lock only while reading the tail
+TAIL_SCRIPT = """
+import os, binascii
+def _tail(path, start, count, lock):
+    if lock:
+        open(lock, "w").close()
+    try:
+        try:
+            size = os.stat(path)[6]
+        except OSError:
+            size = -1
+        data = b""
+        if size > start:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(count)
+    finally:
+        if lock:
+            os.remove(lock)
+    print("TAIL", size, binascii.hexlify(data).decode() or "-")
+_tail({path!r}, {start}, {count}, {lock!r})
+"""
+
+
+def parse_tail(output):
+    """
+    Returns (file size or -1 if missing, data) from the output of TAIL_SCRIPT.
+    """
+    for line in reversed(output.splitlines()):
+        fields = line.split()
+        if len(fields) == 3 and fields[0] == "TAIL":
+            data = b"" if fields[2] == "-" else binascii.unhexlify(fields[2])
+            return int(fields[1]), data
+    raise ValueError("no TAIL line in the device output")
+
+
+class MpremoteDevice:
+    """
+    A Pico reached with one "mpremote exec" per read.
+    """
+
+    def __init__(self, port=PORT, timeout=30):
+        self.port = port
+        self.timeout = timeout
+
+    def read_tail(self, path, start, count, lock=None):
+        script = TAIL_SCRIPT.format(path=path, start=start, count=count, lock=lock)
+        result = subprocess.run(["mpremote", "connect", self.port, "exec", script],
+                                capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode:
+            raise OSError(result.stderr.strip() or f"mpremote exited with {result.returncode}")
+        return parse_tail(result.stdout)
+
+
+class LocalDevice:
+    """
+    Stand-in for a Pico whose filesystem is the folder root: runs TAIL_SCRIPT under CPython,
+    so transfers can be tested (and timed) against a file some other process is appending to.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def read_tail(self, path, start, count, lock=None):
+        script = TAIL_SCRIPT.format(path=self._path(path), start=start, count=count,
+                                    lock=lock and self._path(lock))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exec(script, {})
+        return parse_tail(output.getvalue())
+
+
+def transfer(device, local_file, remote_file=PICO_FILE, lock=TRANSFER_SIGNAL, max_chunk=MAX_CHUNK):
+    """
+    Appends the complete lines added to remote_file since the last transfer to local_file and
+    returns the number of bytes appended. If the Pico file no longer continues the local copy
+    (it was restarted or replaced), the local copy is moved aside and the new file pulled from the start.
+    """
+    appended = 0
+    while True:
+        offset = os.path.getsize(local_file) if os.path.exists(local_file) else 0
+        anchor = b""
+        if offset:
+            with open(local_file, "rb") as f:
+                f.seek(max(0, offset - ANCHOR))
+                anchor = f.read()
+        with span("read tail"):
+            size, data = device.read_tail(remote_file, offset - len(anchor), len(anchor) + max_chunk, lock)
+
+        if size < 0:  # before the restart check, so a wrong path never moves the local copy aside
+            raise FileNotFoundError(f"{remote_file} not found on the Pico")
+        if offset and (size < offset or data[:len(anchor)] != anchor):
+            backup = f"{local_file}.{time.strftime('%Y%m%d-%H%M%S')}"
+            os.replace(local_file, backup)
+            print(f"{remote_file} on the Pico no longer continues {local_file} (moved to {backup}), starting over")
+            continue
+
+        data = data[len(anchor):]
+        complete = data[:data.rfind(b"\n") + 1]  # a line the Pico is still writing waits for the next transfer
+        if complete:
+            with span("append"), open(local_file, "ab") as f:
+                f.write(complete)
+            appended += len(complete)
+            count("bytes appended", len(complete))
+        if len(data) < max_chunk or not complete:
+            return appended
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Copy what batt_test.py logged since the last transfer off the Pico, every minute.")
+    parser.add_argument("--port", default=PORT, help=f"serial port of the Pico (default: {PORT})")
+    parser.add_argument("--dest", default=DEST_DIR, help=f"folder of the local copy (default: {DEST_DIR})")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help=f"seconds between transfers (default: {INTERVAL})")
+    parser.add_argument("--once", action="store_true", help="transfer once and exit")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    os.makedirs(args.dest, exist_ok=True)
+    local_file = os.path.join(args.dest, os.path.basename(PICO_FILE))
+    device = MpremoteDevice(args.port)
+    while True:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        started = time.perf_counter()
+        try:
+            with span("transfer"):
+                appended = transfer(device, local_file)
+            print(f"{stamp} - {appended} new bytes in {time.perf_counter() - started:.2f} s "
+                  f"({os.path.getsize(local_file)} bytes in {local_file})")
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"{stamp} - Failed to retrieve data ({e}). Is the Pico connected?")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import os
+import struct
+import subprocess
+import sys
+import time
+import numpy as np
+from profiling import add_arguments, count, profiled, span, start
+
+# host side of the binary frames written by charge_controller_tests/RFI_stream.py:
+#   header   "<2sHHII"  magic b"BF", sequence number, samples, sample period (us), ticks_us of the first sample
+#   samples  uint16[samples]
+#   checksum "<I"       (sum of the samples + sequence + samples + period + tick) & 0xFFFFFFFF
+MAGIC = b"BF"
+FRAME_HEADER = struct.Struct("<2sHHII")
+CHECKSUM = struct.Struct("<I")
+TICKS_PERIOD = 1 << 30  # ticks_us wraps around at 2**30 us
+MAX_FRAME_SAMPLES = 16384  # a header claiming more is taken for noise
+READ_SIZE = 1 << 16
+ADC_MAX = 65535
+STREAM_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "charge_controller_tests", "RFI_stream.py")
+STUBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pico_stubs")
+
+
+class FrameDecoder:
+    """
+    Turns the byte stream into NumPy arrays. Bytes can be fed in pieces of any size; a frame whose
+    header or checksum doesn't check out is skipped by searching for the next magic, and frames the
+    Pico dropped show up as gaps in the sequence numbers (lost_frames) and in the timestamps.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.bad_frames = 0
+        self.lost_frames = 0
+        self.skipped_bytes = 0
+        self.last_sequence = None
+        self.last_tick = None
+        self.time_us = 0  # first sample of the last frame, in us since the first frame (ticks unwrapped)
+
+    @profiled("decode")
+    def feed(self, data):
+        """
+        Adds bytes and returns (timestamps in seconds since the first frame, ADC codes) of every frame
+        they completed.
+        """
+        buf = self.buffer
+        buf += data
+        times, codes = [], []
+        pos = 0
+        while True:
+            start = buf.find(MAGIC, pos)
+            if start < 0:
+                keep = len(buf) - 1 if buf.endswith(MAGIC[:1]) else len(buf)  # may be half a magic
+                self.skipped_bytes += keep - pos
+                pos = keep
+                break
+            self.skipped_bytes += start - pos
+            pos = start
+            if len(buf) - start < FRAME_HEADER.size:
+                break
+            _, sequence, samples, period, tick = FRAME_HEADER.unpack_from(buf, start)
+            if not 0 < samples <= MAX_FRAME_SAMPLES or not period:
+                self.bad_frames += 1
+                pos = start + 1
+                continue
+            end = start + FRAME_HEADER.size + 2 * samples + CHECKSUM.size
+            if len(buf) < end:
+                break
+            frame = np.frombuffer(buf, "<u2", samples, start + FRAME_HEADER.size).astype(np.uint16)
+            (checksum,) = CHECKSUM.unpack_from(buf, end - CHECKSUM.size)
+            if (int(frame.sum(dtype=np.int64)) + sequence + samples + period + tick) & 0xFFFFFFFF != checksum:
+                self.bad_frames += 1
+                pos = start + 1
+                continue
+
+            if self.last_sequence is not None:
+                self.lost_frames += (sequence - self.last_sequence - 1) & 0xFFFF
+                self.time_us += (tick - self.last_tick) % TICKS_PERIOD
+            self.last_sequence, self.last_tick = sequence, tick
+            times.append((self.time_us + period * np.arange(samples)) / 1e6)
+            codes.append(frame)
+            self.frames += 1
+            pos = end
+        del buf[:pos]
+        if not times:
+            return np.empty(0), np.empty(0, dtype=np.uint16)
+        return np.concatenate(times), np.concatenate(codes)
+
+
+def decode(data):
+    """
+    Decodes a whole capture; returns (timestamps, codes, decoder) with the decoder's counters.
+    """
+    decoder = FrameDecoder()
+    timestamps, codes = decoder.feed(data)
+    return timestamps, codes, decoder
+
+
+def read_port(path, seconds=None, raw_out=None):
+    """
+    Reads frames from a serial port (or capture file, or "-" for stdin) until seconds of samples
+    have arrived or the input ends. Returns (timestamps, codes, decoder).
+    """
+    if path == "-":
+        fd = sys.stdin.buffer.fileno()
+    else:
+        fd = os.open(path, os.O_RDONLY | os.O_NOCTTY)
+        if os.isatty(fd):
+            import termios
+            import tty
+            tty.setraw(fd, termios.TCSANOW)  # bytes as sent, no \r\n translation, keeping what has arrived
+    decoder = FrameDecoder()
+    times, codes = [], []
+    try:
+        while True:
+            with span("read"):
+                data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            count("bytes read", len(data))
+            if raw_out:
+                raw_out.write(data)
+            t, c = decoder.feed(data)
+            times.append(t)
+            codes.append(c)
+            if seconds is not None and t.size and t[-1] >= seconds:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if path != "-":
+            os.close(fd)
+    timestamps = np.concatenate(times) if times else np.empty(0)
+    codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.uint16)
+    return timestamps, codes, decoder
+
+
+@profiled("save")
+def save(path, timestamps, codes):
+    """
+    Saves samples as a "<seconds> <sensor_value>" text log like RFI_test.py's (for the plot scripts),
+    or as a 2-row .npy array of seconds and codes.
+    """
+    if path.endswith(".npy"):
+        np.save(path, np.vstack((timestamps, codes)))
+        return
+    lines = np.char.add(np.char.add(np.char.mod("%.6f", timestamps), " "), np.char.mod("%.7g", codes / ADC_MAX))
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n" if len(lines) else "")
+
+
+def loopback(seconds=2.0, sample_rate=1000, frame_samples=256):
+    """
+    Runs RFI_stream.py on Linux against the stub machine module and decodes its output as it
+    arrives, the same way as from a Pico. Returns (timestamps, codes, decoder, wall seconds).
+    """
+    code = ("import machine, RFI_stream\n"
+            f"RFI_stream.stream(machine.ADC(machine.Pin(28)), {sample_rate}, {frame_samples}, {seconds})\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join((STUBS, os.path.dirname(STREAM_SCRIPT))))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, env=env)
+    decoder = FrameDecoder()
+    times, codes = [], []
+    while True:
+        data = process.stdout.read1(READ_SIZE)
+        if not data:
+            break
+        t, c = decoder.feed(data)
+        times.append(t)
+        codes.append(c)
+    process.wait()
+    return np.concatenate(times), np.concatenate(codes), decoder, time.perf_counter() - start
+
+
+def report(timestamps, codes, decoder):
+    span = timestamps[-1] - timestamps[0] if timestamps.size > 1 else 0.0
+    rate = (len(timestamps) - 1) / span if span else 0.0
+    print(f"{decoder.frames} frames, {len(codes)} samples over {span:.3f} s ({rate:.0f} samples/s); "
+          f"{decoder.lost_frames} lost, {decoder.bad_frames} bad, {decoder.skipped_bytes} bytes skipped")
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Decode the binary frames streamed by RFI_stream.py.")
+    parser.add_argument("source", nargs="?", help='serial port (e.g. /dev/ttyACM0), capture file or "-" for stdin')
+    parser.add_argument("-o", "--out", help="save the samples as a text log (.text) or a NumPy array (.npy)")
+    parser.add_argument("--raw", help="also save the received bytes to this capture file")
+    parser.add_argument("--seconds", type=float, help="stop after this many seconds of samples")
+    parser.add_argument("--loopback", action="store_true",
+                        help="run RFI_stream.py against the stub machine module instead of reading a Pico")
+    parser.add_argument("--rate", type=int, default=1000, help="sample rate for --loopback (default: 1000)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    start(args.profile, args.profile_memory)
+
+    if args.loopback:
+        timestamps, codes, decoder, wall = loopback(args.seconds or 2.0, args.rate)
+        print(f"loopback: {wall:.2f} s wall time")
+    elif args.source:
+        raw_out = open(args.raw, "wb") if args.raw else None
+        try:
+            timestamps, codes, decoder = read_port(args.source, args.seconds, raw_out)
+        finally:
+            if raw_out:
+                raw_out.close()
+    else:
+        parser.error("give a source or --loopback")
+    report(timestamps, codes, decoder)
+    if args.out:
+        save(args.out, timestamps, codes)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,45 @@
 from machine import Pin, ADC
-from time import sleep, time
-
-try:
-    SAMPLE_INTERVAL = 1  # seconds
-    analogue_input = ADC(Pin(28))  # ADC pin
-    while True:
-        sensor_value = analogue_input.read_u16() / 65535  # reads sensor value
-        print(time(), sensor_value)
-        sleep(1)
-except KeyboardInterrupt:
-    print("Program interrupted. Exiting gracefully.")
+from time import sleep_us, ticks_add, ticks_diff, ticks_us, time
+
+SAMPLE_INTERVAL = 1  # seconds between printed values
+# ADC reads averaged into each printed value, spread evenly over the interval (1 = a single read, as before);
+# the sum of the reads has to stay a small int (65535 * OVERSAMPLE < 2**30), so at most 16384
+OVERSAMPLE = 64
+
+
+def read_average(adc, reads, step_us, deadline):
+    """
+    Reads the ADC reads times, one every step_us from deadline on, and returns (the mean code rounded,
+    in read_u16() units, the deadline after the last read). Averaging n reads cuts the noise by about
+    sqrt(n), so the mean carries more bits than one 12-bit read.
+    """
+    total = 0
+    for _ in range(reads):
+        total += adc.read_u16()
+        deadline = ticks_add(deadline, step_us)
+        wait = ticks_diff(deadline, ticks_us())
+        if wait > 0:
+            sleep_us(wait)
+    return (total + reads // 2) // reads, deadline  # integer math only, no float per read
+
+
+def stream(adc, sample_interval=SAMPLE_INTERVAL, oversample=OVERSAMPLE, count=None):
+    """
+    Prints "<time> <sensor_value>" once per sample_interval (count times, or forever), the same
+    lines as a single read per second, so every host script reads them unchanged.
+    """
+    step_us = int(sample_interval * 1000000) // oversample
+    deadline = ticks_us()  # carried over between values, so the interval doesn't drift
+    while count is None or count > 0:
+        code, deadline = read_average(adc, oversample, step_us, deadline)
+        print(time(), code / 65535)  # normalized [0, 1]
+        if count is not None:
+            count -= 1
+
+
+if __name__ == "__main__":
+    try:
+        analogue_input = ADC(Pin(28))  # ADC pin
+        stream(analogue_input)
+    except KeyboardInterrupt:
+        print("Program interrupted. Exiting gracefully.")